@@ -0,0 +1,146 @@
+import argparse
+import filecmp
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import parallel
+import remove_br_tags
+import update_blob_image_hrefs
+
+
+def _generate_tree(root, topics, br_ratio, image_ratio, seed):
+    rng = random.Random(seed)
+    blob_root = os.path.join(root, "blob", "master")
+    os.makedirs(blob_root)
+    blobs = [f"{index:05d}.jpg" for index in range(200)]
+    for name in blobs:
+        with open(os.path.join(blob_root, name), "wb") as handle:
+            handle.write(b"\xff\xd8")
+
+    body = '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n'
+    for index in range(topics):
+        directory = os.path.join(root, f"{index // 1000:03d}", "en_xml")
+        os.makedirs(directory, exist_ok=True)
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<topic id="t" xml:lang="en">\n<body>\n']
+        parts.append(body * rng.randint(10, 60))
+        if rng.random() < br_ratio:
+            parts.append("<p>one<br/>two<BR>three</p>\n")
+        if rng.random() < image_ratio:
+            name = rng.choice(blobs) if rng.random() < 0.9 else "absent.jpg"
+            parts.append(f'<image href="{name}" placement="break"/>\n')
+        parts.append("</body>\n</topic>\n")
+        with open(os.path.join(directory, f"topic{index}_en.dita"), "w", encoding="utf-8") as handle:
+            handle.write("".join(parts))
+    return blob_root
+
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as handle:
+        return handle.read()
+
+
+def _write_text(path, text):
+    with open(path, "w", encoding="utf-8", newline="") as handle:
+        handle.write(text)
+
+
+def _legacy_rewrites(dita_files, blob_root):
+    # The scripts as they were before: decode every topic, run the regex,
+    # write in place, one file at a time.
+    for path in dita_files:
+        text = _read_text(path)
+        updated_text, result = update_blob_image_hrefs.rewrite_text(path, text, blob_root, "")
+        if result["changed"]:
+            _write_text(path, updated_text)
+    for path in dita_files:
+        text = _read_text(path)
+        updated_text, result = remove_br_tags.rewrite_text(text)
+        if result["changed"]:
+            _write_text(path, updated_text)
+
+
+def _current_rewrites(dita_files, blob_root, workers):
+    update_blob_image_hrefs.update_files(dita_files, blob_root, "", False, workers)
+    remove_br_tags.update_files(dita_files, False, workers)
+
+
+def _same_tree(left, right):
+    comparison = filecmp.dircmp(left, right)
+    pending = [comparison]
+    while pending:
+        current = pending.pop()
+        if current.left_only or current.right_only or current.funny_files:
+            return False
+        _, mismatch, errors = filecmp.cmpfiles(
+            current.left, current.right, current.common_files, shallow=False
+        )
+        if mismatch or errors:
+            return False
+        pending.extend(current.subdirs.values())
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the blob href and <br/> rewrites against the previous "
+        "read-decode-write loop."
+    )
+    parser.add_argument("--topics", type=int, default=100000)
+    parser.add_argument("--br-ratio", type=float, default=0.03)
+    parser.add_argument("--image-ratio", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_rewrites_")
+    os.makedirs(work_dir, exist_ok=True)
+    template = os.path.join(work_dir, "template")
+    if not os.path.isdir(template):
+        _generate_tree(template, args.topics, args.br_ratio, args.image_ratio, args.seed)
+    workers = max(1, args.workers or parallel.default_workers())
+
+    legacy_dir = os.path.join(work_dir, "legacy")
+    current_dir = os.path.join(work_dir, "current")
+    results = {}
+    for label, target, run in (
+        ("legacy", legacy_dir, lambda files, blob_root: _legacy_rewrites(files, blob_root)),
+        (
+            "current",
+            current_dir,
+            lambda files, blob_root: _current_rewrites(files, blob_root, workers),
+        ),
+    ):
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(template, target)
+        dita_files = list(remove_br_tags.collect_dita_files(target))
+        blob_root = os.path.join(target, "blob", "master")
+        # Flush the copy so its writeback does not land inside the timing.
+        if hasattr(os, "sync"):
+            os.sync()
+        started = time.perf_counter()
+        run(dita_files, blob_root)
+        results[label] = {"seconds": round(time.perf_counter() - started, 3)}
+
+    stats = {
+        "work_dir": work_dir,
+        "topics": args.topics,
+        "workers": workers,
+        "legacy": results["legacy"],
+        "current": results["current"],
+        "speedup": round(results["legacy"]["seconds"] / results["current"]["seconds"], 2),
+        "identical_output": _same_tree(legacy_dir, current_dir),
+    }
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"RESULT:{json.dumps(stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import unzip
+
+
+def _generate_archive(path, total_mb, image_ratio, seed):
+    rng = random.Random(seed)
+    target = total_mb * 1024 * 1024
+    written = 0
+    index = 0
+    with zipfile.ZipFile(path, 'w') as archive:
+        while written < target:
+            if rng.random() < image_ratio:
+                size = rng.randint(200 * 1024, 4 * 1024 * 1024)
+                payload = os.urandom(size)
+                name = f"blob/master/{index:07d}.jpg"
+                archive.writestr(name, payload, compress_type=zipfile.ZIP_STORED)
+            else:
+                size = rng.randint(2 * 1024, 64 * 1024)
+                payload = (b'<field key="text"><content>lorem ipsum</content></field>\n' * (size // 56 + 1))[:size]
+                name = f"items/master/{{ITEM-{index}}}/en/{rng.randint(1, 3)}/xml"
+                if name in archive.NameToInfo:
+                    name = f"items/master/{{ITEM-{index}}}/en/{index}/data"
+                archive.writestr(name, payload, compress_type=zipfile.ZIP_DEFLATED)
+            written += size
+            index += 1
+    return path
+
+
+def _legacy_extract(zip_path, output_dir, workers):
+    # The writer as it was before: makedirs per member, default copy buffer,
+    # archive order.
+    with zipfile.ZipFile(zip_path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+    local = threading.local()
+
+    def write(info):
+        archive = getattr(local, 'archive', None)
+        if archive is None:
+            archive = local.archive = zipfile.ZipFile(zip_path)
+        output_path = os.path.join(output_dir, info.filename)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with archive.open(info.filename) as source, open(output_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(write, infos))
+    return len(infos)
+
+
+def _timed(label, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return label, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark unzip.py's member writer against the previous writer."
+    )
+    parser.add_argument("--archive", default=None, help="Existing archive to extract.")
+    parser.add_argument(
+        "--generate-mb",
+        type=int,
+        default=512,
+        help="Size of the synthetic image-heavy archive when --archive is omitted.",
+    )
+    parser.add_argument("--image-ratio", type=float, default=0.6)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_unzip_")
+    os.makedirs(work_dir, exist_ok=True)
+    archive = args.archive
+    if not archive:
+        archive = _generate_archive(
+            os.path.join(work_dir, "bench.zip"), args.generate_mb, args.image_ratio, args.seed
+        )
+
+    with zipfile.ZipFile(archive) as handle:
+        infos = [info for info in handle.infolist() if not info.is_dir()]
+    total_bytes = sum(info.file_size for info in infos)
+    stored = sum(1 for info in infos if info.compress_type == zipfile.ZIP_STORED)
+    workers = unzip._get_concurrency()
+
+    legacy_dir = os.path.join(work_dir, "legacy")
+    current_dir = os.path.join(work_dir, "current")
+    results = {}
+    for label, func in (
+        ("legacy", lambda: _legacy_extract(archive, legacy_dir, workers)),
+        ("current", lambda: unzip.extract_zip(archive, current_dir)),
+    ):
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+        shutil.rmtree(current_dir, ignore_errors=True)
+        _, elapsed = _timed(label, func)
+        results[label] = {
+            "seconds": round(elapsed, 3),
+            "mb_per_sec": round(total_bytes / (1024 * 1024) / elapsed, 1),
+        }
+
+    stats = {
+        "archive": archive,
+        "members": len(infos),
+        "stored_members": stored,
+        "uncompressed_mb": round(total_bytes / (1024 * 1024), 1),
+        "concurrency": workers,
+        "legacy": results["legacy"],
+        "current": results["current"],
+        "speedup": round(results["legacy"]["seconds"] / results["current"]["seconds"], 2),
+    }
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"RESULT:{json.dumps(stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
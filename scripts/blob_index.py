@@ -0,0 +1,66 @@
+import os
+import sqlite3
+
+
+INDEX_DIRNAME = "_tmp"
+INDEX_FILENAME = "blob_index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    item_id TEXT,
+    blob TEXT,
+    extension TEXT
+);
+"""
+
+
+def default_path(xslt_root):
+    # Kept with the job's output, never in the shared image export.
+    return os.path.join(xslt_root, INDEX_DIRNAME, INDEX_FILENAME)
+
+
+def open_index(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=60)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def load_items(conn):
+    return {
+        path: {
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "id": item_id,
+            "blob": blob,
+            "extension": extension,
+        }
+        for path, mtime_ns, size, item_id, blob, extension in conn.execute(
+            "SELECT path, mtime_ns, size, item_id, blob, extension FROM items"
+        )
+    }
+
+
+def save_items(conn, records, removed, reset=False):
+    with conn:
+        if reset:
+            conn.execute("DELETE FROM items")
+        conn.executemany("DELETE FROM items WHERE path = ?", [(path,) for path in removed])
+        conn.executemany(
+            "INSERT OR REPLACE INTO items (path, mtime_ns, size, item_id, blob, extension) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    path,
+                    record["mtime_ns"],
+                    record["size"],
+                    record["id"],
+                    record["blob"],
+                    record["extension"],
+                )
+                for path, record in records.items()
+            ],
+        )
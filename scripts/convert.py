@@ -0,0 +1,536 @@
+import argparse
+import functools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing import freeze_support
+
+import dita_manifest
+import fileio
+import finalize_blobs
+import postprocess_dita
+import relocate_dita
+import remove_br_tags
+import run_db
+import unzip
+import workspace
+import xslt_pipeline
+
+
+STAGES = ("extract", "transform", "blobs", "relocate", "copy_blobs", "postprocess")
+# Blob finalization only needs the extracted tree; pipelined runs do it
+# first so streamed topics can already see which blobs exist.
+PIPELINED_STAGES = ("extract", "blobs", "transform", "relocate", "copy_blobs", "postprocess")
+SOURCE_PATTERN = "*_xml"
+DEFAULT_IMAGES_ROOT = os.path.join(
+    "Mike_Rice_Images-Export-CCS",
+    "package",
+    "items",
+    "master",
+    "sitecore",
+    "media library",
+    "Images",
+    "Cancer information",
+)
+DEFAULT_OPTIONS = {
+    "stages": STAGES,
+    "dry_run": False,
+    "workers": None,
+    "xslt_dir": None,
+    "events": "text",
+    "blob_dir": finalize_blobs.DEFAULT_BLOB_DIR,
+    "images_root": DEFAULT_IMAGES_ROOT,
+    "prefix": "",
+    "passes": postprocess_dita.PASS_ORDER,
+    "pipelined": False,
+    "run_db": None,
+    "log": print,
+}
+
+
+def _topic_paths(output_dir, dir_topics):
+    return {
+        os.path.join(output_dir, *relative.split("/")): entry
+        for relative, entry in (dir_topics or {}).items()
+    }
+
+
+class _TopicStream:
+    # Runs the passes that only need the topic itself on one thread, source
+    # by source as the XSLT pool finishes them, so post-processing overlaps
+    # the transform instead of waiting on its slowest source.
+    def __init__(self, passes, dry_run, destination):
+        self.passes = passes
+        self.dry_run = dry_run
+        self.destination = destination
+        self.changed = set()
+        self.described = {}
+        self.seconds = 0.0
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def put(self, output_dir, topics):
+        self.queue.put((output_dir, topics))
+
+    def _drain(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            started = time.perf_counter()
+            try:
+                postprocess_dita.stream_passes(
+                    _topic_paths(*item),
+                    self.passes,
+                    self.dry_run,
+                    self.destination,
+                    self.changed,
+                    self.described,
+                )
+            except Exception as exc:
+                self.error = str(exc)
+            self.seconds += time.perf_counter() - started
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        return self.error
+
+
+def _extract(context):
+    export_zip = context["export_zip"]
+    if not export_zip or not os.path.isfile(export_zip):
+        return None, f"Zip file not found: {export_zip}"
+    errors = []
+
+    def log(line):
+        if line.startswith("ERROR:"):
+            errors.append(line[len("ERROR:"):])
+        context["log"](line)
+
+    files = unzip.extract_zip(export_zip, context["paths"]["output"], log=log)
+    stats = {"zip_path": export_zip, "output_dir": context["paths"]["output"], "files": files}
+    return stats, errors[0] if errors else None
+
+
+def _transform(context):
+    error = xslt_pipeline.saxonche_error()
+    if error:
+        return None, error
+    options = context["options"]
+    xslt_root = context["xslt_root"]
+    argv = [
+        "--input",
+        context["paths"]["output"],
+        "--output-dir",
+        xslt_root,
+        "--pattern",
+        SOURCE_PATTERN,
+        "--overwrite",
+        "--prune-stale",
+        # copy_blobs owns xslt_output/blob.
+        "--keep",
+        "blob",
+        "--quiet",
+        "--events",
+        options["events"],
+    ]
+    if options["xslt_dir"]:
+        argv.extend(["--xslt-dir", options["xslt_dir"]])
+    if options["workers"]:
+        argv.extend(["--workers", str(options["workers"])])
+    # Every export shares one run database, so compare can set a run against
+    # earlier runs of the same export; an empty path disables it.
+    run_db_path = options["run_db"]
+    if run_db_path is None:
+        run_db_path = run_db.default_path()
+    argv.extend(["--run-db", run_db_path])
+
+    stream = None
+    if context["pipelined"]:
+        try:
+            stream = _start_stream(context)
+        except ValueError as exc:
+            return None, str(exc)
+    try:
+        code, report = xslt_pipeline.run(argv, stream.put if stream else None)
+    finally:
+        stream_error = stream.close() if stream else None
+    if report is None:
+        return None, f"XSLT pipeline failed with exit code {code}"
+    topics = {}
+    for output_dir, dir_topics in report.pop("topics").items():
+        topics.update(_topic_paths(output_dir, dir_topics))
+    context["topics"] = topics
+    report["output_dir"] = xslt_root
+    if stream_error:
+        return report, f"Pipelined post-processing failed: {stream_error}"
+    if report["failed"]:
+        return report, f"XSLT pipeline reported {report['failed']} failed file(s)"
+    if code:
+        return report, f"XSLT pipeline failed with exit code {code}"
+    return report, None
+
+
+def _blobs(context):
+    options = context["options"]
+    blob_dir = os.path.abspath(options["blob_dir"])
+    master_dir = os.path.join(blob_dir, finalize_blobs.MASTER_DIRNAME)
+    if not os.path.isdir(blob_dir):
+        return None, f"Blob directory not found: {blob_dir}"
+    if not os.path.isdir(master_dir):
+        return None, f"Blob master directory not found: {master_dir}"
+    os.makedirs(context["paths"]["output"], exist_ok=True)
+
+    stats = finalize_blobs.finalize(
+        blob_dir,
+        os.path.join(context["paths"]["output"], "blob"),
+        workers=options["workers"],
+        dry_run=options["dry_run"],
+    )
+    for error in stats["errors"]:
+        context["log"](f"ERROR:{error}")
+    return stats, stats["errors"][0] if stats["failed"] else None
+
+
+def _relocate(context):
+    dry_run = context["options"]["dry_run"]
+    xslt_root = context["xslt_root"]
+    result, moved = relocate_dita.relocate(xslt_root, dry_run, context["options"]["workers"])
+    for error in result["errors"]:
+        context["log"](f"ERROR:{error['source_path']}: {error['error']}")
+
+    manifests_updated = 0
+    if not dry_run and moved:
+        context["moved"] = moved
+        manifests_updated = dita_manifest.remap([xslt_root, *result["roots"]], moved)
+        if context["topics"] is not None:
+            context["topics"] = {
+                moved.get(path, path): entry for path, entry in context["topics"].items()
+            }
+    stats = {
+        "xslt_root": xslt_root,
+        **result,
+        "manifests_updated": manifests_updated,
+        "dry_run": dry_run,
+    }
+    return stats, None
+
+
+def _copy_blobs(context):
+    source_dir = os.path.join(context["paths"]["output"], "blob")
+    dest_dir = os.path.join(context["xslt_root"], "blob")
+    dry_run = context["options"]["dry_run"]
+    if not os.path.isdir(source_dir):
+        return None, f"Blob source not found: {source_dir}"
+    # Only blobs whose bytes changed are placed again (reflinked or copied),
+    # so re-runs leave the rest of xslt_output/blob untouched.
+    writes = {"written": 0, "unchanged": 0, "removed": 0}
+    if not dry_run:
+        writes = fileio.sync_tree(source_dir, dest_dir, place=finalize_blobs.replace)
+    stats = {
+        "source_dir": source_dir,
+        "dest_dir": dest_dir,
+        "files": writes["written"] + writes["unchanged"],
+        "written": writes["written"],
+        "unchanged": writes["unchanged"],
+        "removed": writes["removed"],
+        "dry_run": dry_run,
+    }
+    return stats, None
+
+
+def _build_passes(context, blob_source=None):
+    options = context["options"]
+    return postprocess_dita.build_passes(
+        set(options["passes"]),
+        images_root=options["images_root"],
+        blob_root=os.path.join(context["xslt_root"], "blob", "master"),
+        prefix=options["prefix"],
+        blob_source=blob_source,
+        xslt_root=context["xslt_root"],
+    )
+
+
+def _relocated_path(xslt_root, path):
+    return os.path.join(relocate_dita.relocated_dir(xslt_root, path), os.path.basename(path))
+
+
+def _start_stream(context):
+    xslt_root = context["xslt_root"]
+    blob_source = None
+    if "copy_blobs" in context["stages"]:
+        blob_source = os.path.join(context["paths"]["output"], "blob", "master")
+    passes = _build_passes(context, blob_source)
+
+    destination = None
+    if "relocate" in context["stages"] and not context["options"]["dry_run"]:
+        destination = functools.partial(_relocated_path, xslt_root)
+    stream = _TopicStream(
+        [step for step in passes if not step.barrier],
+        context["options"]["dry_run"],
+        destination,
+    )
+    context["post"] = {"passes": passes, "stream": stream}
+    return stream
+
+
+def _finish_pipelined(context, post):
+    # The local passes already ran as sources finished; what is left is the
+    # barrier over the relocated topics, which reads only those with xrefs.
+    dry_run = context["options"]["dry_run"]
+    xslt_root = context["xslt_root"]
+    moved = context["moved"]
+    changed = {moved.get(path, path) for path in post["stream"].changed}
+    # Streamed topics were described again when written; relocation keeps
+    # their size and mtime, so those entries stay valid at the new paths.
+    described = {
+        moved.get(path, path): entry for path, entry in post["stream"].described.items()
+    }
+    dita_files = sorted(context["topics"])
+    if not dita_files:
+        return None, "No DITA files found under XSLT root."
+    manifest = dita_manifest.from_topics({**context["topics"], **described})
+    barrier = [step for step in post["passes"] if step.barrier]
+    _, errors = postprocess_dita.run_passes(
+        dita_files, barrier, dry_run, manifest, changed, described
+    )
+    if described:
+        dita_manifest.refresh(xslt_root, described)
+    for error in errors:
+        context["log"](f"ERROR:{error}")
+    stats = postprocess_dita.summarize(
+        xslt_root, post["passes"], dita_files, len(changed), manifest, dry_run
+    )
+    stats["pipelined"] = True
+    stats["streamed_seconds"] = round(post["stream"].seconds, 3)
+    return stats, errors[0] if errors else None
+
+
+def _postprocess(context):
+    options = context["options"]
+    xslt_root = context["xslt_root"]
+    if not os.path.isdir(xslt_root):
+        return None, f"XSLT root not found: {xslt_root}"
+    if context["post"] is not None:
+        return _finish_pipelined(context, context["post"])
+    try:
+        passes = _build_passes(context)
+    except ValueError as exc:
+        return None, str(exc)
+
+    # Topics the pipeline described in this run are already in memory
+    # (and were remapped by relocation); only a chain that starts later
+    # walks the tree and reads the manifest back.
+    topics = context["topics"]
+    if topics is None:
+        dita_files = list(remove_br_tags.collect_dita_files(xslt_root))
+        manifest = dita_manifest.load(xslt_root)
+    else:
+        dita_files = sorted(topics)
+        manifest = dita_manifest.from_topics(topics)
+    if not dita_files:
+        return None, "No DITA files found under XSLT root."
+
+    stats, errors = postprocess_dita.postprocess(
+        xslt_root, passes, dita_files, manifest, options["dry_run"]
+    )
+    for error in errors:
+        context["log"](f"ERROR:{error}")
+    return stats, errors[0] if errors else None
+
+
+_STAGE_RUNNERS = {
+    "extract": _extract,
+    "transform": _transform,
+    "blobs": _blobs,
+    "relocate": _relocate,
+    "copy_blobs": _copy_blobs,
+    "postprocess": _postprocess,
+}
+
+
+def convert(export_zip, paths, options=None):
+    # paths is a workspace.workspace_paths()/job_paths() dict. Stages run in
+    # STAGES order and the chain stops at the first one that fails.
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    unknown = set(options["stages"]) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    selected = set(options["stages"])
+    pipelined = bool(options["pipelined"]) and {"transform", "postprocess"} <= selected
+    stages = [
+        stage for stage in (PIPELINED_STAGES if pipelined else STAGES) if stage in selected
+    ]
+
+    context = {
+        "export_zip": os.path.abspath(export_zip) if export_zip else None,
+        "paths": paths,
+        "xslt_root": os.path.realpath(paths["xslt_output"]),
+        "options": options,
+        "stages": stages,
+        "pipelined": pipelined,
+        "log": options["log"],
+        "topics": None,
+        "moved": {},
+        "post": None,
+    }
+    result = {
+        "export_zip": context["export_zip"],
+        "root": paths["root"],
+        "output_dir": paths["output"],
+        "xslt_output_dir": context["xslt_root"],
+        "stages": stages,
+        "pipelined": pipelined,
+        "dry_run": options["dry_run"],
+        "status": "done",
+        "failed_stage": None,
+        "error": None,
+        "durations": {},
+    }
+    started = time.perf_counter()
+    for stage in stages:
+        stage_started = time.perf_counter()
+        try:
+            stats, error = _STAGE_RUNNERS[stage](context)
+        except OSError as exc:
+            stats, error = None, str(exc)
+        result["durations"][stage] = round(time.perf_counter() - stage_started, 3)
+        result[stage] = stats
+        if error:
+            result["status"] = "failed"
+            result["failed_stage"] = stage
+            result["error"] = error
+            break
+    result["duration"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run extraction, the XSLT pipeline and DITA post-processing "
+        "for one export in a single process."
+    )
+    parser.add_argument(
+        "export_zip",
+        nargs="?",
+        default=None,
+        help="Export zip to convert (required for the extract stage).",
+    )
+    parser.add_argument(
+        "--base-dir",
+        default=".",
+        help="Directory holding output/ and xslt_output/ when --job is not given.",
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"Comma-separated stages to run, applied in the order {', '.join(STAGES)}.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Workers for the XSLT pool and the blob and relocation threads.",
+    )
+    parser.add_argument(
+        "--xslt-dir",
+        default=None,
+        help="Directory containing XSLT files (pipeline default when omitted).",
+    )
+    parser.add_argument(
+        "--events",
+        choices=("text", "jsonl"),
+        default="text",
+        help="Pipeline progress output; jsonl streams its events on stdout.",
+    )
+    parser.add_argument(
+        "--blob-dir",
+        default=finalize_blobs.DEFAULT_BLOB_DIR,
+        help="Source blob directory containing master/.",
+    )
+    parser.add_argument(
+        "--images-root",
+        default=DEFAULT_IMAGES_ROOT,
+        help="Root path to Sitecore image export (Cancer information).",
+    )
+    parser.add_argument(
+        "--prefix",
+        default="",
+        help="Href prefix to add for blob images (omit to compute relative path).",
+    )
+    parser.add_argument(
+        "--passes",
+        default=",".join(postprocess_dita.PASS_ORDER),
+        help="Comma-separated post-processing passes to run.",
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Rewrite each source's topics as soon as it is transformed; xrefs "
+        "are resolved in a final pass over the topics that have them.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report blob, relocation and post-processing changes without writing.",
+    )
+    parser.add_argument(
+        "--run-db",
+        default=os.getenv("XSLT_RUN_DB"),
+        help="SQLite database shared by every conversion's pipeline runs (empty "
+        f"string disables; defaults to <workspace-root>/{run_db.RUN_DB_FILENAME}).",
+    )
+    workspace.add_job_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        if args.job:
+            paths = workspace.job_paths(args.job, args.workspace_root)
+        else:
+            paths = workspace.workspace_paths(args.base_dir)
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    if "extract" in stages and not args.export_zip:
+        print("ERROR:An export zip is required for the extract stage.")
+        return 2
+    options = {
+        "stages": stages,
+        "dry_run": args.dry_run,
+        "workers": args.workers,
+        "xslt_dir": args.xslt_dir,
+        "events": args.events,
+        "blob_dir": args.blob_dir,
+        "images_root": args.images_root,
+        "prefix": args.prefix,
+        "passes": [name.strip() for name in args.passes.split(",") if name.strip()],
+        "pipelined": args.pipelined,
+        "run_db": args.run_db,
+    }
+    if args.run_db is None:
+        options["run_db"] = run_db.default_path(workspace_root=args.workspace_root)
+    try:
+        result = convert(args.export_zip, paths, options)
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+
+    if result["error"]:
+        print(f"ERROR:{result['failed_stage']}: {result['error']}")
+    print(f"RESULT:{json.dumps(result)}")
+    return 1 if result["error"] else 0
+
+
+if __name__ == "__main__":
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import json
+import os
+import re
+from pathlib import Path
+
+import fileio
+import remove_br_tags
+import update_image_hrefs
+import update_xref_hrefs
+
+
+MANIFEST_FILENAME = "dita_manifest.json"
+MANIFEST_VERSION = 2
+ROOT_ELEMENT_RE = re.compile(r"<[A-Za-z][^\s/>]*(?P<attrs>[^>]*)>")
+ROOT_ID_RE = re.compile(r'\bid="([^"]*)"')
+
+
+def describe_topic(text):
+    root_match = ROOT_ELEMENT_RE.search(text)
+    id_match = ROOT_ID_RE.search(root_match.group("attrs")) if root_match else None
+    return {
+        "lang": update_xref_hrefs.lang_from_dita_text(text),
+        "topic_id": id_match.group(1) if id_match else None,
+        "ids": update_xref_hrefs.ID_RE.findall(text),
+        "images": [
+            match.group("href") for match in update_image_hrefs.IMAGE_HREF_RE.finditer(text)
+        ],
+        "xrefs": [
+            match.group("href") for match in update_xref_hrefs.XREF_HREF_RE.finditer(text)
+        ],
+        "br_tags": len(remove_br_tags.BR_RE.findall(text)),
+    }
+
+
+def describe_file(path, text):
+    # The size and mtime let readers tell when the topic changed after it
+    # was described, so a stale entry is never trusted.
+    stat = os.stat(path)
+    return {**describe_topic(text), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def describe_outputs(output_dir):
+    output_dir = Path(output_dir)
+    topics = {}
+    for path in sorted(output_dir.rglob("*")):
+        if path.suffix.lower() != ".dita" or not path.is_file():
+            continue
+        text = path.read_text(encoding="utf-8", errors="replace")
+        topics[path.relative_to(output_dir).as_posix()] = describe_file(path, text)
+    return topics
+
+
+def _read_topics(manifest_path):
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return None
+    topics = data.get("topics")
+    return topics if isinstance(topics, dict) else None
+
+
+def _key(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def _manifest_paths(xslt_root):
+    # Multi-batch pipeline runs write one manifest per batch directory.
+    candidates = [os.path.join(xslt_root, MANIFEST_FILENAME)]
+    try:
+        entries = sorted(os.scandir(xslt_root), key=lambda entry: entry.name)
+    except OSError:
+        entries = []
+    candidates.extend(
+        os.path.join(entry.path, MANIFEST_FILENAME) for entry in entries if entry.is_dir()
+    )
+    return candidates
+
+
+def load(xslt_root):
+    manifest = None
+    for manifest_path in _manifest_paths(xslt_root):
+        topics = _read_topics(manifest_path)
+        if topics is None:
+            continue
+        if manifest is None:
+            manifest = {}
+        base = os.path.dirname(manifest_path)
+        for relative, entry in topics.items():
+            manifest[_key(os.path.join(base, *relative.split("/")))] = entry
+    return manifest
+
+
+def lookup(manifest, path):
+    # None unless the topic is still the size and mtime it was described at.
+    if manifest is None:
+        return None
+    entry = manifest.get(_key(path))
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if entry.get("mtime_ns") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
+        return None
+    return entry
+
+
+def from_topics(topics):
+    # Topics held in memory by absolute path, in the shape load() returns.
+    return {_key(path): entry for path, entry in topics.items()}
+
+
+def update(output_root, replaced):
+    # replaced maps each regenerated output dir to its described topics, or
+    # to None when it failed or was removed; entries under those dirs are
+    # dropped before merging, and entries whose file is gone are pruned.
+    output_root = Path(output_root)
+    manifest_path = output_root / MANIFEST_FILENAME
+    topics = _read_topics(manifest_path) or {}
+
+    prefixes = {}
+    for output_dir, dir_topics in replaced.items():
+        try:
+            prefix = Path(output_dir).resolve().relative_to(output_root.resolve()).as_posix()
+        except ValueError:
+            continue
+        prefixes[prefix] = dir_topics
+
+    def replaced_by(relative):
+        parent = relative
+        while True:
+            parent = parent.rpartition("/")[0] or "."
+            if parent in prefixes:
+                return True
+            if parent == ".":
+                return False
+
+    merged = {
+        relative: entry
+        for relative, entry in topics.items()
+        if not replaced_by(relative) and (output_root / relative).is_file()
+    }
+    for prefix, dir_topics in prefixes.items():
+        for relative, entry in (dir_topics or {}).items():
+            merged[relative if prefix == "." else f"{prefix}/{relative}"] = entry
+
+    _write(manifest_path, {"version": MANIFEST_VERSION, "topics": merged})
+    return manifest_path
+
+
+def remap(manifest_dirs, moves):
+    # moves maps absolute source paths to where the topic was relocated;
+    # entries follow their topics so post-processing can keep using them.
+    moves = {_key(source): dest for source, dest in moves.items()}
+    updated = 0
+    for dir_path in manifest_dirs:
+        manifest_path = Path(dir_path) / MANIFEST_FILENAME
+        topics = _read_topics(manifest_path)
+        if not topics:
+            continue
+        remapped = {}
+        moved = []
+        for relative, entry in topics.items():
+            dest = moves.get(_key(os.path.join(dir_path, *relative.split("/"))))
+            if dest is None:
+                remapped[relative] = entry
+            else:
+                moved.append((Path(os.path.relpath(dest, dir_path)).as_posix(), entry))
+        if not moved:
+            continue
+        remapped.update(moved)
+        _write(manifest_path, {"version": MANIFEST_VERSION, "topics": remapped})
+        updated += 1
+    return updated
+
+
+def refresh(xslt_root, described):
+    # described maps absolute paths of rewritten topics to fresh entries, so
+    # post-processing leaves a manifest later runs can still trust.
+    described = {_key(path): entry for path, entry in described.items()}
+    updated = 0
+    for manifest_path in _manifest_paths(xslt_root):
+        topics = _read_topics(manifest_path)
+        if not topics:
+            continue
+        base = os.path.dirname(manifest_path)
+        changed = False
+        for relative in topics:
+            entry = described.get(_key(os.path.join(base, *relative.split("/"))))
+            if entry is not None and entry != topics[relative]:
+                topics[relative] = entry
+                changed = True
+        if changed:
+            _write(manifest_path, {"version": MANIFEST_VERSION, "topics": topics})
+            updated += 1
+    return updated
+
+
+def discard(output_root):
+    # Flat runs write no manifest; one left by an earlier run would be stale.
+    try:
+        os.unlink(os.path.join(output_root, MANIFEST_FILENAME))
+    except FileNotFoundError:
+        pass
+
+
+def _write(manifest_path, data):
+    fileio.write_text_if_changed(str(manifest_path), json.dumps(data, sort_keys=True))
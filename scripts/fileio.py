@@ -0,0 +1,158 @@
+import contextlib
+import errno
+import mmap
+import os
+import shutil
+
+
+MMAP_THRESHOLD = 1024 * 1024
+COMPARE_CHUNK_SIZE = 1024 * 1024
+_READ_FLAGS = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+
+
+def _read_fd(fd, size):
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_text_if_match(path, prefilter):
+    # Most topics have nothing to rewrite, so the raw bytes are searched
+    # before anything is decoded. Plain fd reads skip the buffered file
+    # object, and large files are mapped rather than copied.
+    fd = os.open(path, _READ_FLAGS)
+    try:
+        size = os.fstat(fd).st_size
+        if size < MMAP_THRESHOLD:
+            data = _read_fd(fd, size)
+            if prefilter.search(data) is None:
+                return None
+            return str(data, "utf-8", "surrogateescape")
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+            if prefilter.search(data) is None:
+                return None
+            return str(data, "utf-8", "surrogateescape")
+    finally:
+        os.close(fd)
+
+
+def _write_bytes_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+
+
+def write_text_atomic(path, text):
+    # surrogateescape round-trips undecodable bytes and no newline
+    # translation happens, so only the rewritten spans change on disk.
+    _write_bytes_atomic(path, text.encode("utf-8", "surrogateescape"))
+
+
+def _same_bytes(path, data):
+    try:
+        fd = os.open(path, _READ_FLAGS)
+    except OSError:
+        return False
+    try:
+        size = os.fstat(fd).st_size
+        return size == len(data) and _read_fd(fd, size) == data
+    finally:
+        os.close(fd)
+
+
+def write_bytes_if_changed(path, data):
+    # Identical content keeps the old file, and with it its mtime, so
+    # downstream caches and rsync deltas only see real changes.
+    if _same_bytes(path, data):
+        return False
+    _write_bytes_atomic(path, data)
+    return True
+
+
+def write_text_if_changed(path, text):
+    return write_bytes_if_changed(path, text.encode("utf-8", "surrogateescape"))
+
+
+def _same_file(left, right, left_size):
+    try:
+        if left_size != os.path.getsize(right):
+            return False
+        with open(left, "rb") as left_handle, open(right, "rb") as right_handle:
+            while True:
+                chunk = left_handle.read(COMPARE_CHUNK_SIZE)
+                if chunk != right_handle.read(COMPARE_CHUNK_SIZE):
+                    return False
+                if not chunk:
+                    return True
+    except OSError:
+        return False
+
+
+def _place(source_path, dest_path):
+    if os.path.isdir(dest_path) and not os.path.islink(dest_path):
+        shutil.rmtree(dest_path)
+    try:
+        os.replace(source_path, dest_path)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        temp_path = f"{dest_path}.tmp"
+        try:
+            shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, dest_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temp_path)
+            raise
+
+
+def sync_tree(source_dir, dest_dir, prune=True, place=None):
+    # Moves source_dir's files into dest_dir, leaving files whose bytes
+    # already match untouched. With prune, anything in dest_dir that
+    # source_dir lacks is removed, as if dest_dir had been replaced.
+    # bytes totals source_dir's files, i.e. what dest_dir holds for them.
+    # place(source_path, dest_path) replaces the move, e.g. to copy.
+    place = place or _place
+    stats = {"written": 0, "unchanged": 0, "removed": 0, "bytes": 0}
+    os.makedirs(dest_dir, exist_ok=True)
+    for root, dir_names, file_names in os.walk(source_dir):
+        dir_names.sort()
+        target_root = os.path.join(dest_dir, os.path.relpath(root, source_dir))
+        for name in dir_names:
+            target = os.path.join(target_root, name)
+            if os.path.lexists(target) and not os.path.isdir(target):
+                os.unlink(target)
+                stats["removed"] += 1
+            os.makedirs(target, exist_ok=True)
+        for name in sorted(file_names):
+            source_path = os.path.join(root, name)
+            dest_path = os.path.join(target_root, name)
+            size = os.path.getsize(source_path)
+            stats["bytes"] += size
+            if _same_file(source_path, dest_path, size):
+                stats["unchanged"] += 1
+                continue
+            place(source_path, dest_path)
+            stats["written"] += 1
+        if prune:
+            keep = set(dir_names) | set(file_names)
+            with os.scandir(target_root) as entries:
+                stale = [entry for entry in entries if entry.name not in keep]
+            for entry in stale:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+                stats["removed"] += 1
+    return stats
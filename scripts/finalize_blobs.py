@@ -0,0 +1,230 @@
+import argparse
+import concurrent.futures
+import contextlib
+import errno
+import json
+import os
+import shutil
+import sys
+import time
+
+import workspace
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_BLOB_DIR = os.path.join("Mike_Rice_Images-Export-CCS", "package", "blob")
+MASTER_DIRNAME = "master"
+TARGET_EXTENSION = ".jpeg"
+LINK_MODES = ("auto", "reflink", "copy", "hardlink")
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+
+def _default_workers():
+    return min(32, (os.cpu_count() or 4) * 2)
+
+
+def _target_name(name):
+    return f"{os.path.splitext(name)[0]}{TARGET_EXTENSION}"
+
+
+def plan_finalize(blob_dir, dest_dir):
+    master_dir = os.path.join(blob_dir, MASTER_DIRNAME)
+    directories = set()
+    placements = {}
+    renamed = 0
+    for root, _, files in os.walk(blob_dir):
+        relative_root = os.path.relpath(root, blob_dir)
+        dest_root = os.path.normpath(os.path.join(dest_dir, relative_root))
+        directories.add(dest_root)
+        in_master = os.path.normpath(root) == os.path.normpath(master_dir)
+        # Sorted so name collisions resolve the same way on every run: a
+        # renamed file beats one already carrying the target name, and the
+        # later name wins between renames, as the old rename loop did.
+        for name in sorted(files, key=lambda entry: (_target_name(entry) != entry, entry)):
+            target = _target_name(name) if in_master else name
+            if target != name:
+                renamed += 1
+            placements[os.path.join(dest_root, target)] = os.path.join(root, name)
+    return sorted(directories), placements, renamed
+
+
+def _reflink(source_path, dest_path):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported")
+    with open(source_path, "rb") as source, open(dest_path, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dest_path)
+            raise
+
+
+def _copy(source_path, dest_path):
+    copy_file_range = getattr(os, "copy_file_range", None)
+    with open(source_path, "rb") as source, open(dest_path, "wb") as target:
+        if copy_file_range is not None:
+            try:
+                while copy_file_range(source.fileno(), target.fileno(), COPY_CHUNK_SIZE):
+                    pass
+                return
+            except OSError:
+                source.seek(0)
+                target.seek(0)
+                target.truncate()
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+
+def _place(source_path, dest_path, mode):
+    # Hardlinks share inodes with the export, so an in-place edit of either
+    # side changes both; only link when asked to.
+    if mode == "hardlink":
+        os.link(source_path, dest_path)
+        return "hardlink"
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(source_path, dest_path)
+            return "reflink"
+        except OSError:
+            if mode == "reflink":
+                raise
+    _copy(source_path, dest_path)
+    return "copy"
+
+
+def replace(source_path, dest_path, mode="auto"):
+    # Placed beside dest_path and renamed over it, so a file that is
+    # already there (and may be hardlinked elsewhere) is never rewritten.
+    temp_path = f"{dest_path}.tmp"
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(temp_path)
+    try:
+        kind = _place(source_path, temp_path, mode)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+    return kind
+
+
+def finalize(blob_dir, dest_dir, mode="auto", workers=None, dry_run=False):
+    started = time.perf_counter()
+    directories, placements, renamed = plan_finalize(blob_dir, dest_dir)
+    counts = {"hardlink": 0, "reflink": 0, "copy": 0}
+    total_bytes = 0
+    errors = []
+
+    if not dry_run:
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        for dir_path in directories:
+            os.makedirs(dir_path, exist_ok=True)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers or _default_workers()
+        ) as executor:
+            future_map = {
+                executor.submit(_place, source_path, dest_path, mode): source_path
+                for dest_path, source_path in placements.items()
+            }
+            for future in concurrent.futures.as_completed(future_map):
+                try:
+                    counts[future.result()] += 1
+                except OSError as exc:
+                    errors.append(f"{future_map[future]}: {exc}")
+                    continue
+                try:
+                    total_bytes += os.path.getsize(future_map[future])
+                except OSError:
+                    pass
+
+    return {
+        "source_dir": os.path.abspath(blob_dir),
+        "dest_dir": os.path.abspath(dest_dir),
+        "files": len(placements),
+        "renamed": renamed,
+        "hardlinked": counts["hardlink"],
+        "reflinked": counts["reflink"],
+        "copied": counts["copy"],
+        "bytes": total_bytes,
+        "failed": len(errors),
+        "errors": errors[:25],
+        "dry_run": dry_run,
+        "duration": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Place the blob export into the output tree, renaming "
+        f"blob/{MASTER_DIRNAME} files to {TARGET_EXTENSION}."
+    )
+    parser.add_argument(
+        "--blob-dir",
+        default=DEFAULT_BLOB_DIR,
+        help="Source blob directory containing master/.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Output root; blobs land in <output-dir>/blob "
+        "(defaults to the job workspace with --job, else ./output).",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=LINK_MODES,
+        default="auto",
+        help="How files are placed: reflink, then copy_file_range with auto. "
+        "hardlink shares inodes with the blob export and must be asked for.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker threads.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report the plan without touching the output tree.",
+    )
+    workspace.add_job_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, output_dir="output")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    blob_dir = os.path.abspath(args.blob_dir)
+    output_dir = os.path.abspath(args.output_dir or "output")
+
+    if not os.path.isdir(blob_dir):
+        print(f"ERROR:Blob directory not found: {blob_dir}")
+        return 2
+    if not os.path.isdir(os.path.join(blob_dir, MASTER_DIRNAME)):
+        print(f"ERROR:Blob master directory not found: {os.path.join(blob_dir, MASTER_DIRNAME)}")
+        return 2
+
+    stats = finalize(
+        blob_dir,
+        os.path.join(output_dir, "blob"),
+        mode=args.mode,
+        workers=args.workers,
+        dry_run=args.dry_run,
+    )
+    for error in stats["errors"]:
+        print(f"ERROR:{error}")
+    print(f"RESULT:{json.dumps(stats)}")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    finish_seq INTEGER,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (queue, finish_seq);
+"""
+
+
+def open_queue(path):
+    # Rollback journal rather than WAL: WAL needs shared memory, which
+    # network filesystems do not provide.
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def new_queue_name():
+    return uuid.uuid4().hex
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue(conn, queue, payloads):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO jobs (queue, payload, status, created_at) VALUES (?, ?, 'queued', ?)",
+            [(queue, json.dumps(payload), now) for payload in payloads],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _next_finish_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(finish_seq), 0) + 1 FROM jobs").fetchone()[0]
+
+
+def _expire_leases(conn, now, max_attempts):
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires = NULL "
+        "WHERE status = 'leased' AND lease_expires < ? AND attempts < ?",
+        (now, max_attempts),
+    )
+    for (job_id,) in conn.execute(
+        "SELECT id FROM jobs WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+        (now, max_attempts),
+    ).fetchall():
+        result = {"error": f"Lease expired {max_attempts} times"}
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, "
+            "result = ?, finish_seq = ?, finished_at = ? WHERE id = ?",
+            (json.dumps(result), _next_finish_seq(conn), now, job_id),
+        )
+
+
+def requeue_expired(conn, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _expire_leases(conn, time.time(), max_attempts)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def claim(conn, owner, lease_seconds=DEFAULT_LEASE_SECONDS, queue=None,
+          max_attempts=DEFAULT_MAX_ATTEMPTS):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _expire_leases(conn, now, max_attempts)
+        if queue:
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' AND queue = ? "
+                "ORDER BY id LIMIT 1",
+                (queue,),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (owner, now + lease_seconds, row[0]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+
+def renew(conn, job_id, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires = ? "
+        "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+        (time.time() + lease_seconds, job_id, owner),
+    )
+    return cursor.rowcount == 1
+
+
+def complete(conn, job_id, owner, result, failed=False):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+            "result = ?, finish_seq = ?, finished_at = ? "
+            "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (
+                "failed" if failed else "done",
+                json.dumps(result, default=str),
+                _next_finish_seq(conn),
+                now,
+                job_id,
+                owner,
+            ),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return cursor.rowcount == 1
+
+
+def finished_since(conn, queue, finish_seq):
+    rows = conn.execute(
+        "SELECT finish_seq, payload, status, result FROM jobs "
+        "WHERE queue = ? AND finish_seq > ? ORDER BY finish_seq",
+        (queue, finish_seq),
+    ).fetchall()
+    return [
+        (seq, json.loads(payload), status, json.loads(result) if result else {})
+        for seq, payload, status, result in rows
+    ]
+
+
+def outstanding(conn, queue):
+    return conn.execute(
+        "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status IN ('queued', 'leased')",
+        (queue,),
+    ).fetchone()[0]
+
+
+def cancel(conn, queue):
+    conn.execute(
+        "UPDATE jobs SET status = 'cancelled', lease_owner = NULL, lease_expires = NULL "
+        "WHERE queue = ? AND status IN ('queued', 'leased')",
+        (queue,),
+    )
@@ -0,0 +1,202 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import zipfile
+import zlib
+
+import workspace
+
+
+STORED_EXTENSIONS = {
+    ".jpeg", ".jpg", ".png", ".gif", ".webp", ".zip", ".gz", ".7z",
+    ".mp3", ".mp4", ".mov", ".woff", ".woff2",
+}
+DEFAULT_EXCLUDES = ("_tmp",)
+DEFAULT_LEVEL = 6
+# Members above this are streamed by the writer instead of held in memory.
+INLINE_LIMIT = 64 * 1024 * 1024
+
+
+def _default_workers():
+    return os.cpu_count() or 4
+
+
+def _collect_files(root, archive_path, excludes):
+    archive_path = os.path.abspath(archive_path)
+    entries = []
+    for dir_path, dir_names, files in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names if name not in excludes)
+        for name in sorted(files):
+            path = os.path.join(dir_path, name)
+            if os.path.abspath(path) == archive_path:
+                continue
+            arcname = os.path.relpath(path, root).replace(os.sep, "/")
+            entries.append((path, arcname))
+    return entries
+
+
+def _is_stored(arcname):
+    return os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+
+
+def _compress_member(path, arcname, level):
+    info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+    if info.file_size > INLINE_LIMIT:
+        return info, None
+
+    with open(path, "rb") as handle:
+        raw = handle.read()
+    info.file_size = len(raw)
+    info.CRC = zlib.crc32(raw)
+    info.compress_type = zipfile.ZIP_STORED
+    data = raw
+    if raw and not _is_stored(arcname):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(raw) + compressor.flush()
+        if len(deflated) < len(raw):
+            info.compress_type = zipfile.ZIP_DEFLATED
+            data = deflated
+    info.compress_size = len(data)
+    return info, data
+
+
+def _append_member(archive, info, data):
+    # zipfile has no public "add already-compressed bytes" call. The header
+    # and bookkeeping below mirror what ZipFile.writestr does after it has
+    # compressed, so close() still writes a normal (ZIP64-aware) directory.
+    info.header_offset = archive.fp.tell()
+    archive.fp.write(info.FileHeader())
+    archive.fp.write(data)
+    archive.filelist.append(info)
+    archive.NameToInfo[info.filename] = info
+    archive.start_dir = archive.fp.tell()
+    archive._didModify = True
+
+
+def package_tree(root, archive_path, workers=None, level=DEFAULT_LEVEL, excludes=DEFAULT_EXCLUDES):
+    started = time.perf_counter()
+    entries = _collect_files(root, archive_path, set(excludes))
+    stats = {
+        "files": len(entries),
+        "deflated": 0,
+        "stored": 0,
+        "streamed": 0,
+        "input_bytes": 0,
+    }
+
+    temp_path = f"{archive_path}.tmp"
+    workers = workers or _default_workers()
+    # Bounded look-ahead keeps memory flat while the writer stays in order.
+    window = workers * 4
+    try:
+        with zipfile.ZipFile(temp_path, "w", allowZip64=True) as archive, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            queue = iter(entries)
+            while True:
+                while len(pending) < window:
+                    entry = next(queue, None)
+                    if entry is None:
+                        break
+                    path, arcname = entry
+                    pending.append(
+                        (path, arcname, executor.submit(_compress_member, path, arcname, level))
+                    )
+                if not pending:
+                    break
+
+                path, arcname, future = pending.popleft()
+                info, data = future.result()
+                if data is None:
+                    compress_type = (
+                        zipfile.ZIP_STORED if _is_stored(arcname) else zipfile.ZIP_DEFLATED
+                    )
+                    archive.write(path, arcname, compress_type=compress_type, compresslevel=level)
+                    stats["streamed"] += 1
+                    stats["input_bytes"] += os.path.getsize(path)
+                    continue
+                _append_member(archive, info, data)
+                stats["input_bytes"] += info.file_size
+                if info.compress_type == zipfile.ZIP_DEFLATED:
+                    stats["deflated"] += 1
+                else:
+                    stats["stored"] += 1
+        os.replace(temp_path, archive_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    stats["archive_bytes"] = os.path.getsize(archive_path)
+    stats["duration"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Zip xslt_output into the deliverable archive, compressing members in parallel."
+    )
+    parser.add_argument(
+        "--xslt-root",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Archive path (defaults to <xslt-root>.zip).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of compression threads (defaults to CPU count).",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=DEFAULT_LEVEL,
+        choices=range(0, 10),
+        metavar="0-9",
+        help="Deflate level.",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=None,
+        help="Directory name to leave out (repeatable, defaults to _tmp).",
+    )
+    workspace.add_job_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
+    xslt_root = os.path.abspath(args.xslt_root)
+    if not os.path.isdir(xslt_root):
+        print(f"ERROR:XSLT root not found: {xslt_root}")
+        return 2
+    archive_path = os.path.abspath(args.output or f"{xslt_root}.zip")
+
+    stats = package_tree(
+        xslt_root,
+        archive_path,
+        workers=args.workers,
+        level=args.level,
+        excludes=args.exclude or DEFAULT_EXCLUDES,
+    )
+    stats = {"xslt_root": xslt_root, "archive": archive_path, **stats}
+    print(f"RESULT:{json.dumps(stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+import concurrent.futures
+import os
+
+
+def default_workers():
+    return os.cpu_count() or 4
+
+
+def parallel_map(fn, items, workers, initializer=None, initargs=()):
+    # Results come back in input order. One worker runs in-process, which
+    # skips the pool's startup and pickling costs on small inputs.
+    if workers <= 1 or len(items) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(fn, items)
+        return
+    chunksize = max(1, min(64, len(items) // (workers * 4)))
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        yield from executor.map(fn, items, chunksize=chunksize)
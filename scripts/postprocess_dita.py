@@ -0,0 +1,616 @@
+import argparse
+import json
+import os
+import sys
+
+import blob_index
+import dita_manifest
+import fileio
+import remove_br_tags
+import update_blob_image_hrefs
+import update_image_hrefs
+import update_xref_hrefs
+import workspace
+import xref_index
+
+
+PASS_ORDER = ("images", "blob", "xref", "br")
+
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as handle:
+        return handle.read()
+
+
+class ImagePass:
+    name = "images"
+    barrier = False
+
+    def __init__(self, images_root, index_path=None):
+        self.images_root = images_root
+        (
+            self.blob_map,
+            _,
+            self.scanned,
+            self.matched,
+            self.parsed,
+        ) = update_image_hrefs.build_blob_index(images_root, index_path=index_path)
+        self.dita_files = 0
+        self.files_changed = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.missing = 0
+        self.missing_lang = 0
+        self.missing_ids = set()
+
+    def error(self):
+        if not self.blob_map:
+            return "No blob entries found under images root."
+        return None
+
+    def recall(self, path):
+        return None
+
+    def wants(self, entry):
+        return bool(entry["images"])
+
+    def skip(self, path, entry):
+        if update_image_hrefs.lang_from_dita_path(path) or entry["lang"]:
+            self.dita_files += 1
+        else:
+            self.missing_lang += 1
+
+    def rewrite(self, path, text, dest=None):
+        # Relocated topics no longer sit under en_xml/fr_xml; their
+        # xml:lang still names the language, as in XrefPass.
+        lang = update_image_hrefs.lang_from_dita_path(path)
+        if not lang:
+            lang = update_xref_hrefs.lang_from_dita_text(text)
+        if not lang:
+            self.missing_lang += 1
+            return text
+        self.dita_files += 1
+        text, result = update_image_hrefs.rewrite_text(text, lang, self.blob_map)
+        self.updated += result["updated"]
+        self.unchanged += result["unchanged"]
+        self.missing += result["missing"]
+        self.missing_ids |= result["missing_ids"]
+        self.files_changed += result["changed"]
+        return text
+
+    def stats(self):
+        return {
+            "images_root": self.images_root,
+            "scanned_items": self.scanned,
+            "blob_entries": self.matched,
+            "parsed_items": self.parsed,
+            "dita_files": self.dita_files,
+            "files_changed": self.files_changed,
+            "images_updated": self.updated,
+            "images_unchanged": self.unchanged,
+            "images_missing_blob": self.missing,
+            "missing_lang_files": self.missing_lang,
+            "missing_blob_ids": sorted(self.missing_ids)[:25],
+        }
+
+
+class BlobPass:
+    name = "blob"
+    barrier = False
+
+    def __init__(self, blob_root, href_prefix, source_root=None):
+        # With source_root, blobs are looked up in the tree that will be
+        # copied to blob_root, so topics can be rewritten before the copy.
+        self.blob_root = blob_root
+        self.href_prefix = href_prefix
+        self.source_root = source_root
+        self.dita_files = 0
+        self.files_changed = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.missing = 0
+        self.missing_files = set()
+
+    def error(self):
+        return None
+
+    def recall(self, path):
+        return None
+
+    def wants(self, entry):
+        return bool(entry["images"])
+
+    def skip(self, path, entry):
+        self.dita_files += 1
+
+    def _is_file(self, candidate):
+        if self.source_root is None:
+            return os.path.isfile(candidate)
+        return os.path.isfile(
+            os.path.join(self.source_root, os.path.relpath(candidate, self.blob_root))
+        )
+
+    def rewrite(self, path, text, dest=None):
+        # Hrefs are relative to where the topic will live once relocated.
+        self.dita_files += 1
+        text, result = update_blob_image_hrefs.rewrite_text(
+            dest or path, text, self.blob_root, self.href_prefix, self._is_file
+        )
+        self.updated += result["updated"]
+        self.unchanged += result["unchanged"]
+        self.missing += result["missing"]
+        self.missing_files |= result["missing_files"]
+        self.files_changed += result["changed"]
+        return text
+
+    def stats(self):
+        return {
+            "blob_root": self.blob_root,
+            "dita_files": self.dita_files,
+            "files_changed": self.files_changed,
+            "images_updated": self.updated,
+            "images_unchanged": self.unchanged,
+            "images_missing_blob": self.missing,
+            "missing_files": sorted(self.missing_files)[:25],
+        }
+
+
+class XrefPass:
+    # A barrier: hrefs can only be resolved once every topic's ids are
+    # known, so topics with xrefs wait here while the rest stream through.
+    # With xslt_root, each topic's ids and unresolved targets persist in its
+    # xref index, so unchanged topics are not read again on later runs.
+    name = "xref"
+    barrier = True
+
+    def __init__(self, xslt_root=None):
+        self.xslt_root = xslt_root
+        self.known = {}
+        self.records = {}
+        self.targets = {}
+        if xslt_root is not None and os.path.isfile(xref_index.default_path(xslt_root)):
+            conn = xref_index.open_index(xref_index.default_path(xslt_root))
+            try:
+                self.known = {
+                    os.path.join(xslt_root, *relative.split("/")): record
+                    for relative, record in xref_index.load_topics(conn).items()
+                }
+            finally:
+                conn.close()
+        self.id_map = {}
+        self.duplicate_keys = set()
+        self.langs = {}
+        self.files_changed = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.missing = 0
+        self.ambiguous = 0
+        self.missing_lang = 0
+        self.missing_ids = set()
+        self.ambiguous_ids = set()
+        self.settled_topics = 0
+
+    def _index(self, path, lang, ids, targets):
+        if not lang:
+            self.missing_lang += 1
+            return False
+        self.langs[path] = lang
+        self.records[path] = {"hash": None, "lang": lang, "ids": ids, "targets": targets}
+        update_xref_hrefs.index_ids(self.id_map, self.duplicate_keys, path, lang, ids)
+        return True
+
+    def recall(self, path):
+        record = self.known.get(path)
+        if record is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if record["mtime_ns"] != stat.st_mtime_ns or record["size"] != stat.st_size:
+            return None
+        return {
+            "lang": record["lang"],
+            "ids": record["ids"],
+            "xrefs": [f"#{target}" for target in record["targets"]],
+        }
+
+    def observe(self, path, text):
+        lang = update_xref_hrefs.lang_from_dita_path(path)
+        if not lang:
+            lang = update_xref_hrefs.lang_from_dita_text(text)
+        targets = update_xref_hrefs.raw_targets(text)
+        if not self._index(path, lang, update_xref_hrefs.ID_RE.findall(text), targets):
+            return False
+        return bool(targets)
+
+    def wants(self, entry):
+        # Hrefs already resolved to a path are never rewritten again.
+        return bool(update_xref_hrefs.href_targets(entry["xrefs"]))
+
+    def skip(self, path, entry):
+        lang = update_xref_hrefs.lang_from_dita_path(path) or entry["lang"]
+        self._index(path, lang, entry["ids"], [])
+
+    def defer(self, path, entry):
+        # Only this pass wants the topic; it is read at the barrier only if
+        # one of its targets now resolves to another topic.
+        lang = update_xref_hrefs.lang_from_dita_path(path) or entry["lang"]
+        targets = update_xref_hrefs.href_targets(entry["xrefs"])
+        if not self._index(path, lang, entry["ids"], targets):
+            return False
+        self.targets[path] = targets
+        return True
+
+    def settled(self, path):
+        outcome = update_xref_hrefs.resolve_targets(
+            path, self.langs[path], self.targets[path], self.id_map, self.duplicate_keys
+        )
+        if outcome is None:
+            return False
+        self._add(outcome)
+        self.settled_topics += 1
+        return True
+
+    def error(self):
+        if not self.id_map:
+            return "No X_ IDs found under XSLT root."
+        return None
+
+    def _add(self, result):
+        self.updated += result["updated"]
+        self.unchanged += result["unchanged"]
+        self.missing += result["missing"]
+        self.ambiguous += result["ambiguous"]
+        self.missing_ids |= result["missing_ids"]
+        self.ambiguous_ids |= result["ambiguous_ids"]
+        self.files_changed += result["changed"]
+
+    def rewrite(self, path, text, dest=None):
+        text, result = update_xref_hrefs.rewrite_text(
+            path, text, self.langs[path], self.id_map, self.duplicate_keys
+        )
+        self._add(result)
+        self.records[path]["targets"] = update_xref_hrefs.raw_targets(text)
+        return text
+
+    def save(self):
+        # Called once every write is done, so the stored sizes and mtimes
+        # are those of the final topics.
+        if self.xslt_root is None:
+            return
+
+        def relative(path):
+            return os.path.relpath(path, self.xslt_root).replace(os.sep, "/")
+
+        records = {}
+        for path, record in self.records.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            records[relative(path)] = {
+                **record,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+            }
+        conn = xref_index.open_index(xref_index.default_path(self.xslt_root))
+        try:
+            xref_index.save_topics(
+                conn,
+                records,
+                [relative(path) for path in self.known if path not in self.records],
+            )
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {
+            "dita_files": len(self.langs),
+            "files_changed": self.files_changed,
+            "xrefs_updated": self.updated,
+            "xrefs_unchanged": self.unchanged,
+            "xrefs_missing_target": self.missing,
+            "xrefs_ambiguous_target": self.ambiguous,
+            "duplicate_ids": len(self.duplicate_keys),
+            "missing_lang_files": self.missing_lang,
+            "topics_settled_unread": self.settled_topics,
+            "missing_target_ids": sorted(self.missing_ids)[:25],
+            "ambiguous_target_ids": sorted(self.ambiguous_ids)[:25],
+        }
+
+
+class BrPass:
+    name = "br"
+    barrier = False
+
+    def __init__(self):
+        self.dita_files = 0
+        self.files_changed = 0
+        self.removed = 0
+
+    def error(self):
+        return None
+
+    def recall(self, path):
+        return None
+
+    def wants(self, entry):
+        return entry["br_tags"] > 0
+
+    def skip(self, path, entry):
+        self.dita_files += 1
+
+    def rewrite(self, path, text, dest=None):
+        self.dita_files += 1
+        text, result = remove_br_tags.rewrite_text(text)
+        self.removed += result["removed"]
+        self.files_changed += result["changed"]
+        return text
+
+    def stats(self):
+        return {
+            "dita_files": self.dita_files,
+            "files_changed": self.files_changed,
+            "br_tags_removed": self.removed,
+        }
+
+
+def _apply_passes(passes, path, text, start=0, resume=False):
+    for index in range(start, len(passes)):
+        step = passes[index]
+        if step.barrier and not (resume and index == start):
+            if step.observe(path, text):
+                return text, index
+            continue
+        text = step.rewrite(path, text)
+    return text, None
+
+
+def _recall(passes, path):
+    entry = {}
+    for step in passes:
+        known = step.recall(path)
+        if known is None:
+            return None
+        entry.update(known)
+    return entry
+
+
+def run_passes(dita_files, passes, dry_run, manifest=None, changed_paths=None, described=None):
+    # described, when given, collects fresh manifest entries for the
+    # topics written here.
+    files_changed = 0
+    deferred = []
+
+    def finish(path, changed, text):
+        nonlocal files_changed
+        if changed:
+            files_changed += 1
+            if changed_paths is not None:
+                changed_paths.add(path)
+            if not dry_run:
+                fileio.write_text_if_changed(path, text)
+                if described is not None:
+                    described[path] = dita_manifest.describe_file(path, text)
+
+    for path in dita_files:
+        # Topics the manifest (or failing that, the passes' own indexes)
+        # shows no pass would touch are never read; nor are those only a
+        # barrier wants, until it knows one of their targets moved.
+        entry = dita_manifest.lookup(manifest, path)
+        if entry is None:
+            entry = _recall(passes, path)
+        if entry is not None:
+            wanting = [index for index, step in enumerate(passes) if step.wants(entry)]
+            if not wanting:
+                for step in passes:
+                    step.skip(path, entry)
+                continue
+            if len(wanting) == 1 and passes[wanting[0]].barrier:
+                index = wanting[0]
+                for step in passes[:index]:
+                    step.skip(path, entry)
+                if passes[index].defer(path, entry):
+                    deferred.append((path, None, None, index, entry))
+                else:
+                    for step in passes[index + 1:]:
+                        step.skip(path, entry)
+                continue
+        original = _read_text(path)
+        text, waiting_at = _apply_passes(passes, path, original)
+        if waiting_at is None:
+            finish(path, text != original, text)
+        else:
+            deferred.append((path, original, text, waiting_at, entry))
+
+    errors = []
+    for step in passes:
+        if step.barrier and step.error():
+            errors.append(step.error())
+    for path, original, text, waiting_at, entry in deferred:
+        step = passes[waiting_at]
+        if original is None:
+            if step.error() or step.settled(path):
+                for later in passes[waiting_at + 1:]:
+                    later.skip(path, entry)
+                continue
+            original = text = _read_text(path)
+        if step.error():
+            text, _ = _apply_passes(passes, path, text, waiting_at + 1)
+        else:
+            text, _ = _apply_passes(passes, path, text, waiting_at, resume=True)
+        finish(path, text != original, text)
+
+    if not dry_run:
+        for step in passes:
+            if step.barrier:
+                step.save()
+    return files_changed, errors
+
+
+def stream_passes(
+    topics, passes, dry_run, destination=None, changed_paths=None, described=None
+):
+    # For passes that only need the topic itself, so a pipelined run can
+    # rewrite each source's topics while other sources are still being
+    # transformed. Passes see the topic's current path, and as dest the
+    # path destination(path) says it will have once relocated.
+    for path, entry in topics.items():
+        target = destination(path) if destination else None
+        if entry is not None and not any(step.wants(entry) for step in passes):
+            for step in passes:
+                step.skip(path, entry)
+            continue
+        original = _read_text(path)
+        text = original
+        for step in passes:
+            text = step.rewrite(path, text, target)
+        if text != original:
+            if changed_paths is not None:
+                changed_paths.add(path)
+            if not dry_run:
+                fileio.write_text_if_changed(path, text)
+                if described is not None:
+                    described[path] = dita_manifest.describe_file(path, text)
+
+
+def build_passes(
+    selected, images_root=None, blob_root=None, prefix="", blob_source=None, xslt_root=None
+):
+    # Persistent indexes live under xslt_root's _tmp; without it they are rebuilt.
+    unknown = set(selected) - set(PASS_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown passes: {', '.join(sorted(unknown))}")
+
+    passes = []
+    if "images" in selected:
+        if not images_root:
+            raise ValueError("--images-root is required for the images pass.")
+        images_root = os.path.abspath(images_root)
+        if not os.path.isdir(images_root):
+            raise ValueError(f"Images root not found: {images_root}")
+        passes.append(
+            ImagePass(images_root, blob_index.default_path(xslt_root) if xslt_root else None)
+        )
+    if "blob" in selected:
+        blob_root = os.path.abspath(blob_root)
+        if blob_source is not None:
+            blob_source = os.path.abspath(blob_source)
+        if not os.path.isdir(blob_source or blob_root):
+            raise ValueError(f"Blob root not found: {blob_source or blob_root}")
+        passes.append(BlobPass(blob_root, prefix, blob_source))
+    if "xref" in selected:
+        passes.append(XrefPass(xslt_root))
+    if "br" in selected:
+        passes.append(BrPass())
+
+    for step in passes:
+        if not step.barrier and step.error():
+            raise ValueError(step.error())
+    return passes
+
+
+def summarize(xslt_root, passes, dita_files, files_changed, manifest, dry_run):
+    return {
+        "xslt_root": xslt_root,
+        "dita_files": len(dita_files),
+        "files_changed": files_changed,
+        "manifest": manifest is not None,
+        "dry_run": dry_run,
+        "passes": {step.name: {**step.stats(), "dry_run": dry_run} for step in passes},
+    }
+
+
+def postprocess(xslt_root, passes, dita_files, manifest=None, dry_run=False):
+    described = {}
+    files_changed, errors = run_passes(
+        dita_files, passes, dry_run, manifest, described=described
+    )
+    if described:
+        dita_manifest.refresh(xslt_root, described)
+    return summarize(xslt_root, passes, dita_files, files_changed, manifest, dry_run), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply the image, blob, xref and <br/> rewrites to every "
+        ".dita file under xslt_output in one read and one write per file."
+    )
+    parser.add_argument(
+        "--xslt-root",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
+    )
+    parser.add_argument(
+        "--images-root",
+        default=None,
+        help="Root path to Sitecore image export (Cancer information); "
+        "required for the images pass.",
+    )
+    parser.add_argument(
+        "--blob-root",
+        default=None,
+        help="Path to blob/master folder to validate image files "
+        "(defaults to <xslt-root>/blob/master).",
+    )
+    parser.add_argument(
+        "--prefix",
+        default="",
+        help="Href prefix to add for blob images (omit to compute relative path).",
+    )
+    parser.add_argument(
+        "--passes",
+        default=",".join(PASS_ORDER),
+        help=f"Comma-separated passes to run, applied in the order {', '.join(PASS_ORDER)}.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report changes without writing.",
+    )
+    workspace.add_job_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output", blob_root="blob_root")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
+    xslt_root = os.path.abspath(args.xslt_root)
+    if not os.path.isdir(xslt_root):
+        print(f"ERROR:XSLT root not found: {xslt_root}")
+        return 2
+
+    selected = {name.strip() for name in args.passes.split(",") if name.strip()}
+    try:
+        passes = build_passes(
+            selected,
+            images_root=args.images_root,
+            blob_root=args.blob_root or os.path.join(xslt_root, "blob", "master"),
+            prefix=args.prefix,
+            xslt_root=xslt_root,
+        )
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+
+    dita_files = list(remove_br_tags.collect_dita_files(xslt_root))
+    if not dita_files:
+        print("ERROR:No DITA files found under XSLT root.")
+        return 2
+
+    manifest = dita_manifest.load(xslt_root)
+    stats, errors = postprocess(xslt_root, passes, dita_files, manifest, args.dry_run)
+    for error in errors:
+        print(f"ERROR:{error}")
+
+    print(f"RESULT:{json.dumps(stats)}")
+    return 2 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
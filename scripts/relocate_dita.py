@@ -0,0 +1,266 @@
+import argparse
+import concurrent.futures
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+import dita_manifest
+import parallel
+import workspace
+
+
+EXCLUDED_ROOTS = {"_tmp"}
+LOCAL_DIRNAME = "_local"
+GUID_RE = re.compile(
+    r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+)
+SLUG_RESERVED_RE = re.compile(r'[\\/:*?"<>|]+')
+# JavaScript's \s, so renamed topics keep the names the Node relocation gave them.
+SLUG_SPACE_RE = re.compile(
+    r"[\t\n\v\f\r \u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff]+"
+)
+SLUG_LENGTH = 40
+
+
+def _sorted_entries(dir_path):
+    # Node's readdir lists names in byte order; keep that so targets and
+    # collisions resolve in the same order.
+    try:
+        with os.scandir(dir_path) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except OSError:
+        return []
+
+
+def _exists(entry):
+    if entry.is_symlink():
+        return os.path.exists(entry.path)
+    return True
+
+
+def _collect_dita_files(dir_path, files):
+    for entry in _sorted_entries(dir_path):
+        if entry.is_dir(follow_symlinks=False):
+            _collect_dita_files(entry.path, files)
+        elif entry.is_file(follow_symlinks=False) and entry.name.lower().endswith(".dita"):
+            files.append(entry.path)
+
+
+def _collect_targets(dir_path, targets, existing):
+    entries = _sorted_entries(dir_path)
+    found = False
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        if entry.name == LOCAL_DIRNAME or GUID_RE.match(entry.name):
+            files = []
+            _collect_dita_files(entry.path, files)
+            targets.append((entry.path, files))
+            found = True
+            continue
+        _collect_targets(entry.path, targets, existing)
+    if found:
+        # Relocated topics land here, so this listing is the collision snapshot.
+        existing.update(
+            os.path.normcase(entry.path) for entry in entries if _exists(entry)
+        )
+
+
+def _slug(value):
+    sanitized = SLUG_SPACE_RE.sub("_", SLUG_RESERVED_RE.sub("_", value))
+    return sanitized[-SLUG_LENGTH:]
+
+
+def _short_hash(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:8]
+
+
+def relocated_dir(xslt_root, path):
+    # Where a topic's folder ends up once relocated, without listing the
+    # tree: the parent of the outermost _local or GUID folder below its root.
+    # Collision renames only change the file name, never this directory.
+    dir_path = os.path.dirname(path)
+    parts = os.path.relpath(dir_path, xslt_root).split(os.sep)
+    if parts[0] in (os.curdir, os.pardir) or parts[0] in EXCLUDED_ROOTS:
+        return dir_path
+    for index in range(1, len(parts)):
+        if parts[index] == LOCAL_DIRNAME or GUID_RE.match(parts[index]):
+            return os.path.join(xslt_root, *parts[:index])
+    return dir_path
+
+
+def plan_relocation(xslt_root):
+    roots = [
+        entry.path
+        for entry in _sorted_entries(xslt_root)
+        if entry.is_dir(follow_symlinks=False) and entry.name not in EXCLUDED_ROOTS
+    ]
+    targets = []
+    existing = set()
+    for root in roots:
+        _collect_targets(root, targets, existing)
+
+    reserved = set()
+
+    def taken(path):
+        return os.path.normcase(path) in existing or path.lower() in reserved
+
+    plan = []
+    for target_dir, files in targets:
+        parent_dir = os.path.dirname(target_dir)
+        moves = []
+        for source_path in files:
+            name = os.path.basename(source_path)
+            dest_path = os.path.join(parent_dir, name)
+            renamed = taken(dest_path)
+            if renamed:
+                stem, ext = os.path.splitext(name)
+                rel_dir = os.path.dirname(os.path.relpath(source_path, target_dir))
+                slug = _slug(rel_dir or os.path.basename(target_dir))
+                digest = _short_hash(source_path)
+                dest_path = os.path.join(parent_dir, f"{stem}__{slug}__{digest}{ext}")
+                index = 1
+                while taken(dest_path):
+                    dest_path = os.path.join(parent_dir, f"{stem}__{slug}__{digest}_{index}{ext}")
+                    index += 1
+            reserved.add(dest_path.lower())
+            moves.append((source_path, dest_path, renamed))
+        plan.append((target_dir, moves))
+    return roots, plan
+
+
+def _move(source_path, dest_path):
+    try:
+        os.rename(source_path, dest_path)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(source_path, dest_path)
+        shutil.copymode(source_path, dest_path)
+        os.unlink(source_path)
+
+
+def _remove_dir(dir_path):
+    try:
+        shutil.rmtree(dir_path)
+    except FileNotFoundError:
+        pass
+
+
+def _attempt(fn, *args):
+    try:
+        fn(*args)
+    except OSError as exc:
+        return str(exc)
+    return None
+
+
+def relocate(xslt_root, dry_run=False, workers=None):
+    roots, plan = plan_relocation(xslt_root)
+    all_moves = [move for _, moves in plan for move in moves]
+    result = {
+        "roots": roots,
+        "target_dirs": len(plan),
+        "files_found": len(all_moves),
+        "files_to_move": len(all_moves),
+        "files_moved": 0,
+        "files_overwritten": 0,
+        "files_renamed": 0,
+        "dirs_deleted": 0,
+        "errors": [],
+    }
+    moved = {}
+
+    if dry_run:
+        for source_path, dest_path, renamed in all_moves:
+            moved[source_path] = dest_path
+            result["files_renamed"] += renamed
+        return result, moved
+
+    # Destinations are distinct and were free in the snapshot, so renames
+    # do not depend on each other; each target dir goes once its files are out.
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers or parallel.default_workers()
+    ) as executor:
+        errors = executor.map(lambda move: _attempt(_move, move[0], move[1]), all_moves)
+        for (source_path, dest_path, renamed), error in zip(all_moves, errors):
+            if error:
+                result["errors"].append(
+                    {"source_path": source_path, "dest_path": dest_path, "error": error}
+                )
+                continue
+            moved[source_path] = dest_path
+            result["files_moved"] += 1
+            result["files_renamed"] += renamed
+
+        target_dirs = [target_dir for target_dir, _ in plan]
+        for target_dir, error in zip(target_dirs, executor.map(
+            lambda target_dir: _attempt(_remove_dir, target_dir), target_dirs
+        )):
+            if error:
+                result["errors"].append(
+                    {"source_path": target_dir, "dest_path": target_dir, "error": error}
+                )
+            else:
+                result["dirs_deleted"] += 1
+    return result, moved
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move .dita files out of _local and GUID folders under xslt_output "
+        "into their parent folders."
+    )
+    parser.add_argument(
+        "--xslt-root",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report moves without touching files.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of rename threads (defaults to CPU count).",
+    )
+    workspace.add_job_arguments(parser)
+
+    args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
+    xslt_root = os.path.abspath(args.xslt_root)
+
+    result, moved = relocate(xslt_root, args.dry_run, args.workers)
+    for error in result["errors"]:
+        print(f"ERROR:{error['source_path']}: {error['error']}")
+
+    manifests_updated = 0
+    if not args.dry_run and moved:
+        manifests_updated = dita_manifest.remap([xslt_root, *result["roots"]], moved)
+
+    stats = {
+        "xslt_root": xslt_root,
+        **result,
+        "manifests_updated": manifests_updated,
+        "dry_run": args.dry_run,
+    }
+    print(f"RESULT:{json.dumps(stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
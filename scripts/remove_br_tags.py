@@ -1,21 +1,20 @@
 import argparse
+import functools
 import json
 import os
 import re
 import sys
 
-
-BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
-
-
-def _read_text(path):
-    with open(path, "r", encoding="utf-8", errors="replace") as handle:
-        return handle.read()
+import dita_manifest
+import fileio
+import parallel
+import workspace
 
 
-def _write_text(path, text):
-    with open(path, "w", encoding="utf-8", newline="") as handle:
-        handle.write(text)
+BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+# Every BR_RE match starts with these bytes, so topics without them are
+# never decoded.
+BR_PREFILTER_RE = re.compile(rb"<br", re.IGNORECASE)
 
 
 def collect_dita_files(xslt_root):
@@ -25,18 +24,37 @@ def collect_dita_files(xslt_root):
                 yield os.path.join(root, name)
 
 
+def rewrite_text(text):
+    updated_text, removed = BR_RE.subn(" ", text)
+    return updated_text, {"removed": removed, "changed": updated_text != text}
+
+
 def update_dita_file(path, dry_run):
-    text = _read_text(path)
-    matches = list(BR_RE.finditer(text))
-    if not matches:
+    text = fileio.read_text_if_match(path, BR_PREFILTER_RE)
+    if text is None:
         return {"removed": 0, "changed": False}
+    updated_text, result = rewrite_text(text)
+    if result["changed"] and not dry_run:
+        fileio.write_text_atomic(path, updated_text)
+    return result
 
-    updated_text = BR_RE.sub(" ", text)
-    changed = updated_text != text
-    if changed and not dry_run:
-        _write_text(path, updated_text)
 
-    return {"removed": len(matches), "changed": changed}
+def update_files(dita_files, dry_run, workers=1, manifest=None):
+    files_changed = 0
+    br_tags_removed = 0
+    paths = []
+    for path in dita_files:
+        entry = dita_manifest.lookup(manifest, path)
+        if entry is not None and not entry["br_tags"]:
+            continue
+        paths.append(path)
+    for result in parallel.parallel_map(
+        functools.partial(update_dita_file, dry_run=dry_run), paths, workers
+    ):
+        br_tags_removed += result["removed"]
+        if result["changed"]:
+            files_changed += 1
+    return files_changed, br_tags_removed
 
 
 def main():
@@ -45,16 +63,31 @@ def main():
     )
     parser.add_argument(
         "--xslt-root",
-        required=True,
-        help="Root path to xslt_output.",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
     )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="Report changes without writing.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to CPU count; 1 runs in-process).",
+    )
+    workspace.add_job_arguments(parser)
 
     args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
     xslt_root = os.path.abspath(args.xslt_root)
 
     if not os.path.isdir(xslt_root):
@@ -66,20 +99,20 @@ def main():
         print("ERROR:No DITA files found under XSLT root.")
         return 2
 
-    files_changed = 0
-    br_tags_removed = 0
-
-    for path in dita_files:
-        result = update_dita_file(path, args.dry_run)
-        br_tags_removed += result["removed"]
-        if result["changed"]:
-            files_changed += 1
+    manifest = dita_manifest.load(xslt_root)
+    files_changed, br_tags_removed = update_files(
+        dita_files,
+        args.dry_run,
+        max(1, args.workers or parallel.default_workers()),
+        manifest,
+    )
 
     stats = {
         "xslt_root": xslt_root,
         "dita_files": len(dita_files),
         "files_changed": files_changed,
         "br_tags_removed": br_tags_removed,
+        "manifest": manifest is not None,
         "dry_run": args.dry_run,
     }
 
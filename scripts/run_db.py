@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import workspace
+
+
+RUN_DB_FILENAME = "xslt_runs.sqlite"
+SCRATCH_DIRNAME = "_tmp"
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MIN_DELTA = 0.05
+COMMIT_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    input TEXT,
+    output_dir TEXT,
+    workers INTEGER,
+    config TEXT,
+    files INTEGER,
+    failed INTEGER,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    source_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    output TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    duration REAL,
+    input_bytes INTEGER,
+    output_bytes INTEGER,
+    rich_text_issues INTEGER,
+    PRIMARY KEY (run_id, source_key)
+);
+CREATE TABLE IF NOT EXISTS stage_durations (
+    run_id INTEGER NOT NULL,
+    source_key TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (run_id, source_key, stage)
+);
+"""
+
+
+def default_path(output_dir=None, workspace_root=None):
+    # Without an output dir (--job runs, convert.py) every run shares the
+    # workspace root's database, so compare sees earlier runs of an export.
+    # Otherwise it goes in the output's _tmp, which is never packaged.
+    if output_dir:
+        return os.path.join(output_dir, SCRATCH_DIRNAME, RUN_DB_FILENAME)
+    return os.path.join(workspace.workspace_root(workspace_root), RUN_DB_FILENAME)
+
+
+def open_run_db(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def start_run(conn, input_path, output_dir, workers, config):
+    cursor = conn.execute(
+        "INSERT INTO runs (started_at, input, output_dir, workers, config, status) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            time.time(),
+            str(input_path),
+            str(output_dir),
+            workers,
+            json.dumps(config, sort_keys=True, default=str),
+            "running",
+        ),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def record_result(conn, run_id, source_key, source, output, error, issues, metrics):
+    conn.execute(
+        "INSERT OR REPLACE INTO results (run_id, source_key, source, output, status, "
+        "error, duration, input_bytes, output_bytes, rich_text_issues) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            run_id,
+            source_key,
+            str(source),
+            str(output) if output else None,
+            "error" if error else "ok",
+            error,
+            metrics.get("duration"),
+            metrics.get("input_bytes"),
+            metrics.get("output_bytes"),
+            issues,
+        ),
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO stage_durations (run_id, source_key, stage, seconds) "
+        "VALUES (?, ?, ?, ?)",
+        [
+            (run_id, source_key, stage, seconds)
+            for stage, seconds in (metrics.get("stages") or {}).items()
+        ],
+    )
+
+
+def finish_run(conn, run_id, files, failed):
+    conn.execute(
+        "UPDATE runs SET finished_at = ?, files = ?, failed = ?, status = ? WHERE id = ?",
+        (time.time(), files, failed, "failed" if failed else "done", run_id),
+    )
+    conn.commit()
+
+
+def _latest_runs(conn, count):
+    rows = conn.execute(
+        "SELECT id FROM runs WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT ?",
+        (count,),
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def _stage_map(conn, run_id):
+    timings = {}
+    for source_key, stage, seconds in conn.execute(
+        "SELECT source_key, stage, seconds FROM stage_durations WHERE run_id = ?",
+        (run_id,),
+    ):
+        timings[(source_key, stage)] = seconds
+    for source_key, duration in conn.execute(
+        "SELECT source_key, duration FROM results WHERE run_id = ? AND status = 'ok'",
+        (run_id,),
+    ):
+        if duration is not None:
+            timings[(source_key, "total")] = duration
+    return timings
+
+
+def _stage_totals(timings):
+    totals = {}
+    for (_, stage), seconds in timings.items():
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return totals
+
+
+def _is_slower(base, new, threshold, min_delta):
+    return new - base >= min_delta and new > base * (1 + threshold)
+
+
+def compare_runs(conn, base_run, new_run, threshold, min_delta):
+    base = _stage_map(conn, base_run)
+    new = _stage_map(conn, new_run)
+    slower = []
+    for key in sorted(set(base) & set(new)):
+        if _is_slower(base[key], new[key], threshold, min_delta):
+            source_key, stage = key
+            slower.append(
+                {
+                    "source": source_key,
+                    "stage": stage,
+                    "base": base[key],
+                    "new": new[key],
+                    "ratio": round(new[key] / base[key], 3) if base[key] else None,
+                }
+            )
+
+    base_totals = _stage_totals({key: base[key] for key in base if key in new})
+    new_totals = _stage_totals({key: new[key] for key in new if key in base})
+    slower_stages = []
+    for stage in sorted(base_totals):
+        if _is_slower(base_totals[stage], new_totals[stage], threshold, min_delta):
+            slower_stages.append(
+                {
+                    "stage": stage,
+                    "base": round(base_totals[stage], 4),
+                    "new": round(new_totals[stage], 4),
+                }
+            )
+
+    new_failures = [
+        row[0]
+        for row in conn.execute(
+            "SELECT n.source_key FROM results n JOIN results b "
+            "ON b.source_key = n.source_key AND b.run_id = ? "
+            "WHERE n.run_id = ? AND n.status = 'error' AND b.status = 'ok'",
+            (base_run, new_run),
+        )
+    ]
+
+    slower.sort(key=lambda entry: entry["new"] - entry["base"], reverse=True)
+    return {
+        "base_run": base_run,
+        "new_run": new_run,
+        "threshold": threshold,
+        "min_delta": min_delta,
+        "compared_sources": len({key[0] for key in base} & {key[0] for key in new}),
+        "slower_sources": slower,
+        "slower_stages": slower_stages,
+        "new_failures": new_failures,
+    }
+
+
+def compare_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="xslt_pipeline.py compare",
+        description="Flag sources and stages that got slower between two runs.",
+    )
+    parser.add_argument(
+        "base_run",
+        nargs="?",
+        type=int,
+        help="Baseline run id (defaults to the run before the latest).",
+    )
+    parser.add_argument(
+        "new_run",
+        nargs="?",
+        type=int,
+        help="Run id to check (defaults to the latest run).",
+    )
+    parser.add_argument(
+        "--run-db",
+        default=os.getenv("XSLT_RUN_DB"),
+        help=f"SQLite run database (defaults to <output-dir>/{SCRATCH_DIRNAME}/"
+        f"{RUN_DB_FILENAME}, or <workspace-root>/{RUN_DB_FILENAME}).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Output root the runs wrote to with --output-dir; without it the "
+        "workspace root's shared database is read.",
+    )
+    parser.add_argument(
+        "--workspace-root",
+        default=None,
+        help=f"Root for job workspaces (defaults to ${workspace.WORKSPACE_ROOT_ENV} "
+        f"or ./{workspace.DEFAULT_WORKSPACE_ROOT}).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Relative slowdown that counts as a regression (0.2 = 20%%).",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=DEFAULT_MIN_DELTA,
+        help="Ignore slowdowns smaller than this many seconds.",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=25,
+        help="Maximum number of slower sources to print.",
+    )
+    args = parser.parse_args(argv)
+    if not args.run_db:
+        args.run_db = default_path(args.output_dir, args.workspace_root)
+
+    if not os.path.isfile(args.run_db):
+        print(f"ERROR:Run database not found: {args.run_db}")
+        return 2
+
+    conn = open_run_db(args.run_db)
+    try:
+        base_run, new_run = args.base_run, args.new_run
+        if new_run is None:
+            latest = _latest_runs(conn, 2)
+            if base_run is None and len(latest) == 2:
+                new_run, base_run = latest
+            elif latest:
+                new_run = latest[0]
+        if base_run is None or new_run is None:
+            print("ERROR:Need two finished runs to compare.")
+            return 2
+
+        result = compare_runs(conn, base_run, new_run, args.threshold, args.min_delta)
+    finally:
+        conn.close()
+
+    for entry in result["slower_stages"]:
+        print(f"SLOWER_STAGE:{entry['stage']}:{entry['base']}s->{entry['new']}s")
+    for entry in result["slower_sources"][: args.limit]:
+        print(
+            f"SLOWER:{entry['source']}:{entry['stage']}:"
+            f"{entry['base']}s->{entry['new']}s"
+        )
+    for source_key in result["new_failures"][: args.limit]:
+        print(f"NEW_FAILURE:{source_key}")
+
+    result["slower_sources"] = result["slower_sources"][: args.limit]
+    print(f"RESULT:{json.dumps(result)}")
+    regressed = result["slower_stages"] or result["slower_sources"] or result["new_failures"]
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(compare_main(sys.argv[1:]))
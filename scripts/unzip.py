@@ -1,9 +1,23 @@
+import argparse
+import hashlib
+import json
 import zipfile
 import sys
 import os
 import concurrent.futures
 import threading
 import shutil
+import struct
+import zlib
+import workspace
+
+LANGUAGE_DIRS = {'en', 'fr'}
+COPY_BUFFER_SIZE = 1024 * 1024
+RANGE_CHUNK_SIZE = 64 * 1024 * 1024
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+MANIFEST_FILENAME = '.unzip_manifest.json'
+MANIFEST_VERSION = 1
 
 def _get_members(zip_path):
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -13,7 +27,7 @@ def _get_members(zip_path):
             if hasattr(info, 'is_dir'):
                 is_dir = info.is_dir()
             if not is_dir:
-                members.append(info.filename)
+                members.append(info)
         return members
 
 def _get_concurrency():
@@ -64,10 +78,38 @@ def _normalize_entry_name(entry_name):
 def _split_path(entry_name):
     return [part for part in entry_name.replace('\\', '/').split('/')]
 
-def _build_output_map(members, output_dir):
+def _promoted_version_dirs(normalized_names):
+    # <item>/<lang>/<version>/xml is promoted to <item>/<lang>_xml and the rest
+    # of that version directory (nested versions included) is dropped.
+    promoted = {}
+    for normalized in normalized_names:
+        parts = normalized.split(os.sep)
+        if len(parts) < 3 or parts[-1] != 'xml':
+            continue
+        lang, version = parts[-3], parts[-2]
+        if lang.lower() not in LANGUAGE_DIRS or not version.isdigit():
+            continue
+        promoted[os.sep.join(parts[:-1])] = os.path.join(*parts[:-3], f"{lang.lower()}_xml")
+
+    nested = [
+        version_dir for version_dir in promoted
+        if _enclosing_dir(os.path.dirname(version_dir), promoted)
+    ]
+    for version_dir in nested:
+        del promoted[version_dir]
+    return promoted
+
+def _enclosing_dir(normalized, dirs):
+    parts = normalized.split(os.sep)
+    for idx in range(1, len(parts) + 1):
+        prefix = os.sep.join(parts[:idx])
+        if prefix in dirs:
+            return prefix
+    return None
+
+def _plan_output_paths(members, kept=None):
     seen = set()
-    output_root = os.path.abspath(output_dir)
-    output_map = {}
+    normalized_map = {}
     for member in members:
         normalized = _normalize_entry_name(member)
         if not normalized:
@@ -77,88 +119,404 @@ def _build_output_map(members, output_dir):
         if key in seen:
             return f"Duplicate zip entry path: {member}", None
         seen.add(key)
+        normalized_map[member] = normalized
+
+    kept = members if kept is None else kept
+    promoted = _promoted_version_dirs(normalized_map[member] for member in kept)
+    promoted_targets = set(promoted.values())
 
-        output_path = os.path.abspath(os.path.join(output_dir, normalized))
-        if not output_path.startswith(output_root + os.sep) and output_path != output_root:
+    planned = {}
+    for member in kept:
+        normalized = normalized_map[member]
+        version_dir = _enclosing_dir(os.path.dirname(normalized), promoted)
+        if version_dir:
+            if normalized != os.path.join(version_dir, 'xml'):
+                continue
+            normalized = promoted[version_dir]
+        elif normalized in promoted_targets:
+            continue
+        planned[member] = normalized
+
+    return None, planned
+
+def _manifest_key(normalized):
+    return normalized.replace(os.sep, '/')
+
+def _resolve_output_path(output_dir, key):
+    output_root = os.path.abspath(output_dir)
+    output_path = os.path.abspath(os.path.join(output_dir, *key.split('/')))
+    if not output_path.startswith(output_root + os.sep):
+        return None
+    return output_path
+
+def _build_output_map(planned, output_dir, existing_ok=()):
+    output_map = {}
+    for member, normalized in planned.items():
+        key = _manifest_key(normalized)
+        output_path = _resolve_output_path(output_dir, key)
+        if output_path is None:
             return f"Invalid zip entry path: {member}", None
 
-        if os.path.exists(output_path):
+        if key not in existing_ok and os.path.exists(output_path):
             return f"Refusing to overwrite existing path: {output_path}", None
         output_map[member] = output_path
 
     return None, output_map
 
-def _write_member(zip_ref, member_name, output_path):
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with zip_ref.open(member_name) as source, open(output_path, 'wb') as target:
-        shutil.copyfileobj(source, target)
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return None
+    entries = data.get('entries')
+    return entries if isinstance(entries, dict) else None
+
+def _save_manifest(output_dir, entries):
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        json.dump({'version': MANIFEST_VERSION, 'entries': entries}, handle)
+    os.replace(temp_path, manifest_path)
+
+def _drop_manifest(output_dir):
+    try:
+        os.remove(os.path.join(output_dir, MANIFEST_FILENAME))
+    except FileNotFoundError:
+        pass
 
-def _cleanup_language_versions(output_dir):
-    targets = {'en', 'fr'}
+def _reset_output_dir(output_dir):
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+def _is_unchanged(entry, info, output_path):
+    if not isinstance(entry, dict):
+        return False
+    if entry.get('crc') != info.CRC or entry.get('size') != info.file_size:
+        return False
+    try:
+        return os.path.getsize(output_path) == info.file_size
+    except OSError:
+        return False
+
+def _remove_stale_paths(output_dir, keys):
+    output_root = os.path.abspath(output_dir)
+    parents = set()
     removed = 0
-    for root, dirnames, _ in os.walk(output_dir):
-        base = os.path.basename(root).lower()
-        if base in targets:
-            numeric_dirs = [d for d in dirnames if d.isdigit()]
-            if len(numeric_dirs) > 1:
-                numeric_dirs_sorted = sorted(numeric_dirs, key=lambda d: (int(d), d))
-                keep = numeric_dirs_sorted[-1]
-                for name in numeric_dirs_sorted[:-1]:
-                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
-                    removed += 1
-                dirnames[:] = [d for d in dirnames if d == keep or not d.isdigit()]
-            elif len(numeric_dirs) == 1:
-                keep = numeric_dirs[0]
-                dirnames[:] = [d for d in dirnames if d == keep or not d.isdigit()]
+    for key in keys:
+        output_path = _resolve_output_path(output_dir, key)
+        if output_path is None:
+            continue
+        try:
+            os.remove(output_path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        parents.add(os.path.dirname(output_path))
+
+    # Deepest first, so a chain of directories emptied by this run goes too.
+    for dir_path in sorted(parents, key=len, reverse=True):
+        while dir_path.startswith(output_root + os.sep):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                break
+            dir_path = os.path.dirname(dir_path)
     return removed
 
-def _promote_language_xml_files(output_dir):
-    targets = {'en', 'fr'}
-    moved = 0
-    for root, _, files in os.walk(output_dir):
-        if 'xml' not in files:
-            continue
-        lang_dir = os.path.basename(os.path.dirname(root))
-        if lang_dir.lower() not in targets:
-            continue
-        if not os.path.basename(root).isdigit():
+def plan_archive(zip_path):
+    infos = _get_members(zip_path)
+    kept, _, _ = _plan_language_versions(infos)
+    validation_error, planned = _plan_output_paths(
+        [info.filename for info in infos],
+        kept=[info.filename for info in kept],
+    )
+    if validation_error:
+        return validation_error, infos, None
+    return None, infos, planned
+
+def read_member(zip_path, info):
+    if info.flag_bits & 0x1:
+        raise RuntimeError(f"Encrypted zip entry not supported: {info.filename}")
+    if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            return zip_ref.read(info.filename)
+
+    with open(zip_path, 'rb') as raw:
+        offset = _stored_data_offset(raw, info)
+        if offset is None:
+            raise RuntimeError(f"Bad local header for zip entry: {info.filename}")
+        data = _read_at(raw, offset, info.compress_size)
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -zlib.MAX_WBITS)
+    if len(data) != info.file_size or zlib.crc32(data) != info.CRC:
+        raise RuntimeError(f"Bad CRC or size for zip entry: {info.filename}")
+    return data
+
+def _prepare_directories(output_paths):
+    for dir_path in sorted({os.path.dirname(path) for path in output_paths}):
+        os.makedirs(dir_path, exist_ok=True)
+
+def _read_at(raw, offset, size):
+    if hasattr(os, 'pread'):
+        return os.pread(raw.fileno(), size, offset)
+    raw.seek(offset)
+    return raw.read(size)
+
+def _hash_member(zip_ref, info):
+    digest = hashlib.sha256()
+    with zip_ref.open(info) as source:
+        for chunk in iter(lambda: source.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+def _plan_duplicates(members, info_by_name):
+    # CRC32 plus size from the central directory only nominates candidates;
+    # the first of each group is hashed while it is written, the rest are
+    # hashed instead of written, and a matching hash decides.
+    groups = {}
+    for member in members:
+        info = info_by_name[member]
+        if info.file_size:
+            groups.setdefault((info.CRC, info.file_size), []).append(member)
+    return [group for group in groups.values() if len(group) > 1]
+
+def _resolve_duplicates(groups, digests):
+    # Followers whose content differs from every written member of their
+    # group (a real CRC32 collision) still have to be written.
+    duplicates = {}
+    unmatched = []
+    for group in groups:
+        written = {digests[group[0]]: group[0]}
+        for member in group[1:]:
+            primary = written.setdefault(digests[member], member)
+            if primary == member:
+                unmatched.append(member)
+            else:
+                duplicates[member] = primary
+    return duplicates, unmatched
+
+def _extract_member(zip_ref, info, output_path, raw, role):
+    if role == 'follower':
+        return _hash_member(zip_ref, info)
+    digest = hashlib.sha256() if role == 'primary' else None
+    _write_member(zip_ref, info, output_path, raw, digest)
+    return digest.digest() if digest is not None else None
+
+def _link_duplicates(duplicates, output_map, info_by_name):
+    linked = 0
+    saved_bytes = 0
+    for member, primary in duplicates.items():
+        try:
+            os.link(output_map[primary], output_map[member])
+        except OSError:
+            shutil.copyfile(output_map[primary], output_map[member])
             continue
-        xml_path = os.path.join(root, 'xml')
-        dest_dir = os.path.dirname(os.path.dirname(root))
-        dest = os.path.join(dest_dir, f"{lang_dir.lower()}_xml")
-        os.makedirs(dest_dir, exist_ok=True)
-        if os.path.exists(dest):
-            os.remove(dest)
-        shutil.move(xml_path, dest)
-        shutil.rmtree(root, ignore_errors=True)
-        moved += 1
-    return moved
-
-def extract_zip(zip_path, output_dir):
+        linked += 1
+        saved_bytes += info_by_name[member].file_size
+    return linked, saved_bytes
+
+def _unlink_existing(output_paths):
+    # Outputs may be hardlinked to each other; never rewrite one in place.
+    for output_path in output_paths:
+        try:
+            os.remove(output_path)
+        except FileNotFoundError:
+            pass
+
+def _stored_data_offset(raw, info):
+    header = _read_at(raw, info.header_offset, _LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size:
+        return None
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        return None
+    name_length, extra_length = fields[-2], fields[-1]
+    return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+def _copy_range(raw, target, offset, size):
+    src_fd = raw.fileno()
+    dst_fd = target.fileno()
+    remaining = size
+    position = offset
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    while remaining:
+        count = min(remaining, RANGE_CHUNK_SIZE)
+        copied = 0
+        if copy_file_range is not None:
+            try:
+                copied = copy_file_range(src_fd, dst_fd, count, position)
+            except OSError:
+                copy_file_range = None
+        if not copied and sendfile is not None and copy_file_range is None:
+            try:
+                copied = sendfile(dst_fd, src_fd, position, count)
+            except OSError:
+                sendfile = None
+        if not copied:
+            data = _read_at(raw, position, min(count, COPY_BUFFER_SIZE))
+            if not data:
+                raise IOError(f"Unexpected end of archive at offset {position}")
+            view = memoryview(data)
+            while view:
+                view = view[target.write(view):]
+            copied = len(data)
+        position += copied
+        remaining -= copied
+
+def _write_member(zip_ref, info, output_path, raw=None, digest=None):
+    if (
+        digest is None
+        and raw is not None
+        and info.compress_type == zipfile.ZIP_STORED
+        and not info.flag_bits & 0x1
+    ):
+        offset = _stored_data_offset(raw, info)
+        if offset is not None:
+            with open(output_path, 'wb', buffering=0) as target:
+                _copy_range(raw, target, offset, info.file_size)
+            return
+    with zip_ref.open(info) as source, open(output_path, 'wb', buffering=COPY_BUFFER_SIZE) as target:
+        if digest is None:
+            shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+            return
+        for chunk in iter(lambda: source.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+            target.write(chunk)
+
+def _language_version_points(normalized):
+    parts = normalized.split(os.sep)
+    points = []
+    for idx in range(len(parts) - 2):
+        if parts[idx].lower() in LANGUAGE_DIRS and parts[idx + 1].isdigit():
+            points.append((os.sep.join(parts[:idx + 1]), parts[idx + 1]))
+    return points
+
+def _plan_language_versions(members):
+    # Same rule the post-extraction cleanup used: under every en/fr
+    # directory only the highest numeric version directory survives.
+    latest = {}
+    member_points = {}
+    for info in members:
+        normalized = _normalize_entry_name(info.filename)
+        points = _language_version_points(normalized) if normalized else []
+        member_points[info.filename] = points
+        for prefix, version in points:
+            current = latest.get(prefix)
+            if current is None or (int(version), version) > (int(current), current):
+                latest[prefix] = version
+
+    kept = []
+    skipped_bytes = 0
+    for info in members:
+        points = member_points[info.filename]
+        if all(latest[prefix] == version for prefix, version in points):
+            kept.append(info)
+        else:
+            skipped_bytes += info.file_size
+    return kept, len(members) - len(kept), skipped_bytes
+
+def _finish_extraction(
+    zip_path, output_dir, entries, groups, digests, output_map, info_by_name, dedup, log
+):
+    if dedup:
+        duplicates, unmatched = _resolve_duplicates(groups, digests)
+        if unmatched:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                for member in unmatched:
+                    _write_member(zip_ref, info_by_name[member], output_map[member])
+        linked, saved_bytes = _link_duplicates(duplicates, output_map, info_by_name)
+        log(f"DEDUP:{linked}:{saved_bytes}")
+    _save_manifest(output_dir, entries)
+    log(f"EXTRACTED:{len(output_map)}")
+
+def extract_zip(zip_path, output_dir, incremental=True, dedup=False, log=print):
     try:
-        if os.path.exists(output_dir):
-            shutil.rmtree(output_dir)
-        os.makedirs(output_dir, exist_ok=True)
-
-        members = _get_members(zip_path)
-        file_count = len(members)
-        if file_count == 0:
-            print("EXTRACTED:0")
+        manifest = _load_manifest(output_dir) if incremental else None
+        if manifest is None:
+            _reset_output_dir(output_dir)
+
+        infos = _get_members(zip_path)
+        if not infos and manifest is None:
+            _save_manifest(output_dir, {})
+            log("EXTRACTED:0")
+            return 0
+
+        kept, _, _ = _plan_language_versions(infos)
+        validation_error, planned = _plan_output_paths(
+            [info.filename for info in infos],
+            kept=[info.filename for info in kept],
+        )
+        if validation_error:
+            log(f"ERROR:{validation_error}")
             return 0
 
-        validation_error, output_map = _build_output_map(members, output_dir)
+        validation_error, output_map = _build_output_map(
+            planned, output_dir, existing_ok=manifest or ()
+        )
+        if validation_error and manifest is not None:
+            # Something outside the manifest is in the way; start clean.
+            manifest = None
+            _reset_output_dir(output_dir)
+            validation_error, output_map = _build_output_map(planned, output_dir)
         if validation_error:
-            print(f"ERROR:{validation_error}")
+            log(f"ERROR:{validation_error}")
             return 0
 
+        info_by_name = {info.filename: info for info in infos}
+        entries = {}
+        unchanged = 0
+        for member, normalized in planned.items():
+            info = info_by_name[member]
+            key = _manifest_key(normalized)
+            entries[key] = {'member': member, 'crc': info.CRC, 'size': info.file_size}
+            if manifest is not None and _is_unchanged(manifest.get(key), info, output_map[member]):
+                del output_map[member]
+                unchanged += 1
+
+        skipped = [info for info in infos if info.filename not in planned]
+        skipped_bytes = sum(info.file_size for info in skipped)
+        log(f"SKIPPED:{len(skipped)}:{skipped_bytes}")
+        if manifest is not None:
+            # Dropped up front: if this run dies half way, the next one
+            # starts from a clean extraction instead of trusting stale CRCs.
+            _drop_manifest(output_dir)
+            removed = _remove_stale_paths(
+                output_dir, [key for key in manifest if key not in entries]
+            )
+            log(f"UNCHANGED:{unchanged}")
+            log(f"REMOVED:{removed}")
+            _unlink_existing(output_map.values())
+
+        file_count = len(output_map)
+        groups = _plan_duplicates(output_map, info_by_name) if dedup else []
+        roles = {}
+        for group in groups:
+            roles[group[0]] = 'primary'
+            roles.update((member, 'follower') for member in group[1:])
+        digests = {}
+        # Largest members first so a few big blobs never end up at the tail.
+        members = sorted(
+            output_map,
+            key=lambda name: info_by_name[name].file_size,
+            reverse=True,
+        )
+        _prepare_directories(output_map.values())
+
         max_workers = _get_concurrency()
-        if max_workers <= 1 or file_count == 1:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        if max_workers <= 1 or len(members) <= 1:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref, open(zip_path, 'rb') as raw:
                 for member in members:
-                    _write_member(zip_ref, member, output_map[member])
-            _cleanup_language_versions(output_dir)
-            _promote_language_xml_files(output_dir)
-            print(f"EXTRACTED:{file_count}")
+                    digests[member] = _extract_member(
+                        zip_ref, info_by_name[member], output_map[member], raw, roles.get(member)
+                    )
+            _finish_extraction(
+                zip_path, output_dir, entries, groups, digests, output_map, info_by_name, dedup, log
+            )
             return file_count
 
         thread_local = threading.local()
@@ -167,18 +525,22 @@ def extract_zip(zip_path, output_dir):
 
         def init_thread():
             zf = zipfile.ZipFile(zip_path, 'r')
+            raw = open(zip_path, 'rb')
             thread_local.zipfile = zf
+            thread_local.raw = raw
             with open_zipfiles_lock:
                 open_zipfiles.append(zf)
+                open_zipfiles.append(raw)
 
         def extract_member(member_name):
             zf = getattr(thread_local, 'zipfile', None)
+            info = info_by_name[member_name]
             output_path = output_map[member_name]
+            role = roles.get(member_name)
             if zf is None:
                 with zipfile.ZipFile(zip_path, 'r') as fallback_zip:
-                    _write_member(fallback_zip, member_name, output_path)
-                return
-            _write_member(zf, member_name, output_path)
+                    return member_name, _extract_member(fallback_zip, info, output_path, None, role)
+            return member_name, _extract_member(zf, info, output_path, thread_local.raw, role)
 
         first_error = None
         use_initializer = True
@@ -195,7 +557,8 @@ def extract_zip(zip_path, output_dir):
             futures = [executor.submit(extract_member, member) for member in members]
             for future in concurrent.futures.as_completed(futures):
                 try:
-                    future.result()
+                    member_name, digest = future.result()
+                    digests[member_name] = digest
                 except Exception as e:
                     if first_error is None:
                         first_error = e
@@ -209,28 +572,57 @@ def extract_zip(zip_path, output_dir):
                         pass
 
         if first_error:
-            print(f"ERROR:{first_error}")
+            log(f"ERROR:{first_error}")
             return 0
 
-        _cleanup_language_versions(output_dir)
-        _promote_language_xml_files(output_dir)
-        print(f"EXTRACTED:{file_count}")
+        _finish_extraction(
+            zip_path, output_dir, entries, groups, digests, output_map, info_by_name, dedup, log
+        )
         return file_count
         
     except Exception as e:
-        print(f"ERROR:{str(e)}")
+        log(f"ERROR:{str(e)}")
         return 0
 
+def _parse_args(argv):
+    usage = 'Usage: python unzip.py <zip_path> <output_dir> | <zip_path> --job <id>'
+    if not argv:
+        return None, usage
+    parser = argparse.ArgumentParser(description='Extract a Sitecore export zip.')
+    parser.add_argument('zip_path')
+    parser.add_argument('output_dir', nargs='?', default=None)
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Ignore the previous extraction manifest and extract every member.',
+    )
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='Write byte-identical members once and hardlink the duplicates.',
+    )
+    workspace.add_job_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.output_dir is None:
+        if not args.job:
+            return None, usage
+        try:
+            args.output_dir = workspace.job_paths(args.job, args.workspace_root)['output']
+        except ValueError as e:
+            return None, str(e)
+    return args, None
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("ERROR:Usage: python unzip.py <zip_path> <output_dir>")
+    args, usage_error = _parse_args(sys.argv[1:])
+    if usage_error:
+        print(f"ERROR:{usage_error}")
         sys.exit(1)
         
-    zip_path = sys.argv[1]
-    output_dir = sys.argv[2]
+    zip_path = args.zip_path
+    output_dir = args.output_dir
     
     if not os.path.exists(zip_path):
         print(f"ERROR:Zip file not found: {zip_path}")
         sys.exit(1)
         
-    extract_zip(zip_path, output_dir)
+    extract_zip(zip_path, output_dir, incremental=not args.full, dedup=args.dedup)
@@ -1,35 +1,33 @@
 import argparse
+import functools
 import json
 import os
 import re
 import sys
 
+import dita_manifest
+import fileio
+import parallel
+import workspace
+
 
 IMAGE_HREF_RE = re.compile(
     r'(?P<prefix><image\b[^>]*?\bhref=")(?P<href>[^"]*)(?P<suffix>")',
     re.IGNORECASE | re.DOTALL,
 )
+IMAGE_PREFILTER_RE = re.compile(rb"<image", re.IGNORECASE)
+_WORKER = {}
 
 
-def _read_text(path):
-    with open(path, "r", encoding="utf-8", errors="replace") as handle:
-        return handle.read()
-
-
-def _write_text(path, text):
-    with open(path, "w", encoding="utf-8", newline="") as handle:
-        handle.write(text)
-
-
-def update_dita_file(path, blob_root, href_prefix, dry_run):
-    text = _read_text(path)
+def rewrite_text(path, text, blob_root, href_prefix, is_file=os.path.isfile):
     updates = 0
     unchanged = 0
     missing = 0
     missing_files = set()
+    prefix = None
 
     def replacer(match):
-        nonlocal updates, unchanged, missing
+        nonlocal updates, unchanged, missing, prefix
         href = match.group("href").strip()
         if not href:
             return match.group(0)
@@ -38,15 +36,16 @@ def update_dita_file(path, blob_root, href_prefix, dry_run):
             return match.group(0)
 
         candidate = os.path.join(blob_root, href)
-        if not os.path.isfile(candidate):
+        if not is_file(candidate):
             missing += 1
             missing_files.add(href)
             return match.group(0)
 
-        if href_prefix:
-            prefix = href_prefix.rstrip("/")
-        else:
-            prefix = os.path.relpath(blob_root, start=os.path.dirname(path)).replace("\\", "/")
+        if prefix is None:
+            if href_prefix:
+                prefix = href_prefix.rstrip("/")
+            else:
+                prefix = os.path.relpath(blob_root, start=os.path.dirname(path)).replace("\\", "/")
         new_href = f"{prefix}/{href}"
         if href == new_href:
             unchanged += 1
@@ -56,10 +55,7 @@ def update_dita_file(path, blob_root, href_prefix, dry_run):
         return f"{match.group('prefix')}{new_href}{match.group('suffix')}"
 
     updated_text = IMAGE_HREF_RE.sub(replacer, text)
-    if updated_text != text and not dry_run:
-        _write_text(path, updated_text)
-
-    return {
+    return updated_text, {
         "updated": updates,
         "unchanged": unchanged,
         "missing": missing,
@@ -68,19 +64,85 @@ def update_dita_file(path, blob_root, href_prefix, dry_run):
     }
 
 
+def update_dita_file(path, blob_root, href_prefix, dry_run, is_file=os.path.isfile):
+    text = fileio.read_text_if_match(path, IMAGE_PREFILTER_RE)
+    if text is None:
+        return {
+            "updated": 0,
+            "unchanged": 0,
+            "missing": 0,
+            "missing_files": set(),
+            "changed": False,
+        }
+    updated_text, result = rewrite_text(path, text, blob_root, href_prefix, is_file)
+    if result["changed"] and not dry_run:
+        fileio.write_text_atomic(path, updated_text)
+    return result
+
+
+def _init_worker(blob_root, href_prefix, dry_run):
+    _WORKER["blob_root"] = blob_root
+    _WORKER["href_prefix"] = href_prefix
+    _WORKER["dry_run"] = dry_run
+    # Topics share images; each worker stats a blob once per run.
+    _WORKER["is_file"] = functools.lru_cache(maxsize=None)(os.path.isfile)
+
+
+def _update_topic(path):
+    return update_dita_file(
+        path,
+        _WORKER["blob_root"],
+        _WORKER["href_prefix"],
+        _WORKER["dry_run"],
+        _WORKER["is_file"],
+    )
+
+
+def update_files(dita_files, blob_root, href_prefix, dry_run, workers=1, manifest=None):
+    stats = {
+        "files_changed": 0,
+        "images_updated": 0,
+        "images_unchanged": 0,
+        "images_missing_blob": 0,
+    }
+    missing_files = set()
+    paths = []
+    for path in dita_files:
+        entry = dita_manifest.lookup(manifest, path)
+        if entry is not None and not entry["images"]:
+            continue
+        paths.append(path)
+    for result in parallel.parallel_map(
+        _update_topic,
+        paths,
+        workers,
+        initializer=_init_worker,
+        initargs=(blob_root, href_prefix, dry_run),
+    ):
+        stats["images_updated"] += result["updated"]
+        stats["images_unchanged"] += result["unchanged"]
+        stats["images_missing_blob"] += result["missing"]
+        missing_files |= result["missing_files"]
+        if result["changed"]:
+            stats["files_changed"] += 1
+    stats["missing_files"] = sorted(missing_files)[:25]
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Replace DITA image hrefs with relative paths to blob files."
     )
     parser.add_argument(
         "--xslt-root",
-        required=True,
-        help="Root path to xslt_output.",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
     )
     parser.add_argument(
         "--blob-root",
-        required=True,
-        help="Path to blob/master folder to validate image files.",
+        default=None,
+        help="Path to blob/master folder to validate image files "
+        "(defaults to the job workspace with --job).",
     )
     parser.add_argument(
         "--prefix",
@@ -92,8 +154,26 @@ def main():
         action="store_true",
         help="Report changes without writing.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to CPU count; 1 runs in-process).",
+    )
+    workspace.add_job_arguments(parser)
 
     args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output", blob_root="blob_root")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
+    if not args.blob_root:
+        print("ERROR:--blob-root or --job is required.")
+        return 2
     xslt_root = os.path.abspath(args.xslt_root)
     blob_root = os.path.abspath(args.blob_root)
 
@@ -104,37 +184,33 @@ def main():
         print(f"ERROR:Blob root not found: {blob_root}")
         return 2
 
-    total_files = 0
-    files_changed = 0
-    images_updated = 0
-    images_unchanged = 0
-    images_missing = 0
-    missing_files = set()
-
-    for root, _, files in os.walk(xslt_root):
-        for name in files:
-            if not name.lower().endswith(".dita"):
-                continue
-            path = os.path.join(root, name)
-            total_files += 1
-            result = update_dita_file(path, blob_root, args.prefix, args.dry_run)
-            images_updated += result["updated"]
-            images_unchanged += result["unchanged"]
-            images_missing += result["missing"]
-            missing_files |= result["missing_files"]
-            if result["changed"]:
-                files_changed += 1
+    manifest = dita_manifest.load(xslt_root)
+    dita_files = [
+        os.path.join(root, name)
+        for root, _, files in os.walk(xslt_root)
+        for name in files
+        if name.lower().endswith(".dita")
+    ]
+    result = update_files(
+        dita_files,
+        blob_root,
+        args.prefix,
+        args.dry_run,
+        max(1, args.workers or parallel.default_workers()),
+        manifest,
+    )
 
     stats = {
         "xslt_root": xslt_root,
         "blob_root": blob_root,
-        "dita_files": total_files,
-        "files_changed": files_changed,
-        "images_updated": images_updated,
-        "images_unchanged": images_unchanged,
-        "images_missing_blob": images_missing,
+        "dita_files": len(dita_files),
+        "files_changed": result["files_changed"],
+        "images_updated": result["images_updated"],
+        "images_unchanged": result["images_unchanged"],
+        "images_missing_blob": result["images_missing_blob"],
+        "manifest": manifest is not None,
         "dry_run": args.dry_run,
-        "missing_files": sorted(list(missing_files))[:25],
+        "missing_files": result["missing_files"],
     }
 
     print(f"RESULT:{json.dumps(stats)}")
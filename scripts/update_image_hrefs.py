@@ -2,8 +2,16 @@ import argparse
 import json
 import os
 import re
+import sqlite3
 import sys
 
+import blob_index
+import dita_manifest
+import fileio
+import parallel
+import update_xref_hrefs
+import workspace
+
 
 IMAGE_HREF_RE = re.compile(
     r'(?P<prefix><image\b[^>]*?\bhref=")(?P<href>[^"]*)(?P<suffix>")',
@@ -13,6 +21,11 @@ GUID_RE = re.compile(
     r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
     re.IGNORECASE,
 )
+ITEM_FIELD_RE = re.compile(
+    r'\bid="\{(?P<id>[^}]+)\}"'
+    r'|key="(?P<key>blob|extension)"[^>]*>\s*<content>(?P<content>[^<]+)</content>',
+    re.IGNORECASE,
+)
 FORCED_EXTENSION = "jpeg"
 
 
@@ -21,11 +34,6 @@ def _read_text(path):
         return handle.read()
 
 
-def _write_text(path, text):
-    with open(path, "w", encoding="utf-8", newline="") as handle:
-        handle.write(text)
-
-
 def _lang_from_item_path(path):
     parts = path.split(os.sep)
     if len(parts) < 3:
@@ -36,7 +44,7 @@ def _lang_from_item_path(path):
     return None
 
 
-def _lang_from_dita_path(path):
+def lang_from_dita_path(path):
     lower_parts = [part.lower() for part in path.split(os.sep)]
     if "en_xml" in lower_parts:
         return "en"
@@ -46,23 +54,34 @@ def _lang_from_dita_path(path):
 
 
 def _extract_item_details(text):
-    id_match = re.search(r'\bid="\{([^}]+)\}"', text, re.IGNORECASE)
-    blob_match = re.search(
-        r'key="blob"[^>]*>\s*<content>([^<]+)</content>',
-        text,
-        re.IGNORECASE,
-    )
-    if not id_match or not blob_match:
+    # One pass over the item that stops once the first id, blob and
+    # extension have all been seen.
+    fields = {}
+    for match in ITEM_FIELD_RE.finditer(text):
+        if match.group("id") is not None:
+            fields.setdefault("id", match.group("id"))
+        else:
+            fields.setdefault(match.group("key").lower(), match.group("content"))
+        if len(fields) == 3:
+            break
+    if "id" not in fields or "blob" not in fields:
         return None
-    ext_match = re.search(
-        r'key="extension"[^>]*>\s*<content>([^<]+)</content>',
-        text,
-        re.IGNORECASE,
-    )
     return {
-        "id": id_match.group(1).upper(),
-        "blob": blob_match.group(1).strip(),
-        "extension": ext_match.group(1).strip() if ext_match else "",
+        "id": fields["id"].upper(),
+        "blob": fields["blob"].strip(),
+        "extension": fields.get("extension", "").strip(),
+    }
+
+
+def parse_item(path):
+    stat = os.stat(path)
+    details = _extract_item_details(_read_text(path)) or {}
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "id": details.get("id"),
+        "blob": details.get("blob"),
+        "extension": details.get("extension"),
     }
 
 
@@ -83,12 +102,28 @@ def _guid_from_href(href):
     return None
 
 
-def build_blob_index(images_root):
-    blob_map = {}
-    ext_map = {}
-    scanned = 0
-    matched = 0
+def _open_blob_index(index_path):
+    try:
+        return blob_index.open_index(index_path)
+    except (sqlite3.Error, OSError):
+        return None
+
 
+def build_blob_index(images_root, workers=None, index_path=None, full=False):
+    # Items whose size and mtime match the persisted index are not read;
+    # the rest are parsed across the pool and merged in walk order, so the
+    # last version of an item still wins as it did in a serial walk.
+    # Without index_path nothing is persisted and every item is parsed.
+    workers = workers or parallel.default_workers()
+    conn = _open_blob_index(index_path) if index_path else None
+    known = {}
+    if conn is not None and not full:
+        known = blob_index.load_items(conn)
+
+    items = []
+    records = {}
+    pending = []
+    scanned = 0
     for root, _, files in os.walk(images_root):
         for name in files:
             if name.lower() != "xml":
@@ -98,21 +133,58 @@ def build_blob_index(images_root):
             lang = _lang_from_item_path(path)
             if not lang:
                 continue
-            text = _read_text(path)
-            details = _extract_item_details(text)
-            if not details or not details["blob"]:
-                continue
-            key = (details["id"], lang)
-            blob_map[key] = details["blob"]
-            if details["extension"]:
-                ext_map[key] = details["extension"]
-            matched += 1
-
-    return blob_map, ext_map, scanned, matched
-
+            relative = os.path.relpath(path, images_root).replace(os.sep, "/")
+            items.append((relative, lang))
+            record = known.get(relative)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if (
+                record is not None
+                and stat is not None
+                and record["mtime_ns"] == stat.st_mtime_ns
+                and record["size"] == stat.st_size
+            ):
+                records[relative] = record
+            else:
+                pending.append(relative)
+
+    parsed = {}
+    paths = [os.path.join(images_root, *relative.split("/")) for relative in pending]
+    for relative, record in zip(pending, parallel.parallel_map(parse_item, paths, workers)):
+        records[relative] = parsed[relative] = record
 
-def update_dita_file(path, lang, blob_map, ext_map, dry_run):
-    text = _read_text(path)
+    blob_map = {}
+    ext_map = {}
+    matched = 0
+    for relative, lang in items:
+        record = records[relative]
+        if not record["id"] or not record["blob"]:
+            continue
+        key = (record["id"], lang)
+        blob_map[key] = record["blob"]
+        if record["extension"]:
+            ext_map[key] = record["extension"]
+        matched += 1
+
+    if conn is not None:
+        current = {relative for relative, _ in items}
+        try:
+            blob_index.save_items(
+                conn,
+                parsed,
+                [relative for relative in known if relative not in current],
+                reset=full,
+            )
+        except sqlite3.Error:
+            pass
+        conn.close()
+
+    return blob_map, ext_map, scanned, matched, len(parsed)
+
+
+def rewrite_text(text, lang, blob_map):
     updates = 0
     unchanged = 0
     missing = 0
@@ -140,10 +212,7 @@ def update_dita_file(path, lang, blob_map, ext_map, dry_run):
         return f"{match.group('prefix')}{new_href}{match.group('suffix')}"
 
     updated_text = IMAGE_HREF_RE.sub(replacer, text)
-    if updated_text != text and not dry_run:
-        _write_text(path, updated_text)
-
-    return {
+    return updated_text, {
         "updated": updates,
         "unchanged": unchanged,
         "missing": missing,
@@ -152,6 +221,18 @@ def update_dita_file(path, lang, blob_map, ext_map, dry_run):
     }
 
 
+def update_dita_file(path, lang, blob_map, ext_map, dry_run):
+    text = _read_text(path)
+    # Relocated topics no longer sit under en_xml/fr_xml; fall back to xml:lang.
+    lang = lang or update_xref_hrefs.lang_from_dita_text(text)
+    if not lang:
+        return None
+    updated_text, result = rewrite_text(text, lang, blob_map)
+    if result["changed"] and not dry_run:
+        fileio.write_text_if_changed(path, updated_text)
+    return result
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Replace DITA image hrefs with blob ids from Sitecore export."
@@ -163,16 +244,41 @@ def main():
     )
     parser.add_argument(
         "--xslt-root",
-        required=True,
-        help="Root path to xslt_output.",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
     )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="Report changes without writing.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes for parsing changed image items (defaults to CPU count).",
+    )
+    parser.add_argument(
+        "--index-db",
+        default=None,
+        help="Persistent blob index (defaults to <xslt-root>/_tmp/blob_index.sqlite).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the persisted blob index and re-parse every image item.",
+    )
+    workspace.add_job_arguments(parser)
 
     args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
     images_root = os.path.abspath(args.images_root)
     xslt_root = os.path.abspath(args.xslt_root)
 
@@ -183,7 +289,12 @@ def main():
         print(f"ERROR:XSLT root not found: {xslt_root}")
         return 2
 
-    blob_map, ext_map, scanned, matched = build_blob_index(images_root)
+    blob_map, ext_map, scanned, matched, parsed = build_blob_index(
+        images_root,
+        max(1, args.workers or parallel.default_workers()),
+        args.index_db or blob_index.default_path(xslt_root),
+        args.full,
+    )
     if not blob_map:
         print("ERROR:No blob entries found under images root.")
         return 2
@@ -195,18 +306,26 @@ def main():
     images_missing = 0
     missing_lang = 0
     missing_ids = set()
+    manifest = dita_manifest.load(xslt_root)
 
     for root, _, files in os.walk(xslt_root):
         for name in files:
             if not name.lower().endswith(".dita"):
                 continue
             path = os.path.join(root, name)
-            lang = _lang_from_dita_path(path)
-            if not lang:
+            entry = dita_manifest.lookup(manifest, path)
+            lang = lang_from_dita_path(path) or (entry["lang"] if entry else None)
+            if entry is not None and not entry["images"]:
+                if lang:
+                    total_files += 1
+                else:
+                    missing_lang += 1
+                continue
+            result = update_dita_file(path, lang, blob_map, ext_map, args.dry_run)
+            if result is None:
                 missing_lang += 1
                 continue
             total_files += 1
-            result = update_dita_file(path, lang, blob_map, ext_map, args.dry_run)
             images_updated += result["updated"]
             images_unchanged += result["unchanged"]
             images_missing += result["missing"]
@@ -219,12 +338,14 @@ def main():
         "xslt_root": xslt_root,
         "scanned_items": scanned,
         "blob_entries": matched,
+        "parsed_items": parsed,
         "dita_files": total_files,
         "files_changed": files_changed,
         "images_updated": images_updated,
         "images_unchanged": images_unchanged,
         "images_missing_blob": images_missing,
         "missing_lang_files": missing_lang,
+        "manifest": manifest is not None,
         "dry_run": args.dry_run,
         "missing_blob_ids": sorted(list(missing_ids))[:25],
     }
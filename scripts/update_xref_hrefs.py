@@ -1,9 +1,17 @@
 import argparse
+import functools
+import hashlib
 import json
 import os
 import re
 import sys
 
+import dita_manifest
+import fileio
+import parallel
+import workspace
+import xref_index
+
 
 XREF_HREF_RE = re.compile(
     r'(?P<prefix><xref\b[^>]*?\bhref=")(?P<href>[^"]*)(?P<suffix>")',
@@ -13,6 +21,8 @@ XREF_TARGET_RE = re.compile(r'^#(X_[0-9A-F]{32})$', re.IGNORECASE)
 ID_RE = re.compile(r'\bid="(X_[0-9A-F]{32})"', re.IGNORECASE)
 XML_LANG_RE = re.compile(r'\bxml:lang="(en|fr)"', re.IGNORECASE)
 FILENAME_LANG_RE = re.compile(r'[_-](en|fr)\.dita$', re.IGNORECASE)
+DEFAULT_TEXT_CACHE_MB = 256
+_REWRITE = {}
 
 
 def _read_text(path):
@@ -20,12 +30,7 @@ def _read_text(path):
         return handle.read()
 
 
-def _write_text(path, text):
-    with open(path, "w", encoding="utf-8", newline="") as handle:
-        handle.write(text)
-
-
-def _lang_from_dita_path(path):
+def lang_from_dita_path(path):
     lower_parts = [part.lower() for part in path.split(os.sep)]
     if "en_xml" in lower_parts:
         return "en"
@@ -38,7 +43,7 @@ def _lang_from_dita_path(path):
     return None
 
 
-def _lang_from_dita_text(text):
+def lang_from_dita_text(text):
     match = XML_LANG_RE.search(text)
     if match:
         return match.group(1).lower()
@@ -46,44 +51,171 @@ def _lang_from_dita_text(text):
 
 
 def collect_dita_files(xslt_root):
-    files = []
-    missing_lang = 0
+    paths = []
     for root, _, names in os.walk(xslt_root):
         for name in names:
-            if not name.lower().endswith(".dita"):
-                continue
-            path = os.path.join(root, name)
-            lang = _lang_from_dita_path(path)
-            if not lang:
-                try:
-                    lang = _lang_from_dita_text(_read_text(path))
-                except OSError:
-                    lang = None
-            if not lang:
-                missing_lang += 1
-                continue
-            files.append((path, lang))
-    return files, missing_lang
-
-
-def build_id_index(files):
+            if name.lower().endswith(".dita"):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def href_targets(hrefs):
+    # Only "#X_..." hrefs are ever rewritten; resolved ones are left alone.
+    targets = []
+    for href in hrefs:
+        target_match = XREF_TARGET_RE.match(href.strip())
+        if target_match:
+            targets.append(target_match.group(1).upper())
+    return targets
+
+
+def raw_targets(text):
+    return href_targets(match.group("href") for match in XREF_HREF_RE.finditer(text))
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def scan_topic(path):
+    lang = lang_from_dita_path(path)
+    try:
+        stat = os.stat(path)
+        text = _read_text(path)
+    except OSError:
+        if lang:
+            raise
+        return None, None
+    lang = lang or lang_from_dita_text(text)
+    record = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": _digest(text),
+        "lang": lang,
+        "ids": ID_RE.findall(text) if lang else [],
+        "targets": raw_targets(text) if lang else [],
+    }
+    # Only topics with targets left to resolve can be rewritten.
+    return record, text if record["targets"] else None
+
+
+def index_ids(id_map, duplicate_keys, path, lang, ids):
+    for id_value in ids:
+        key = (lang, id_value.upper())
+        if key in id_map and id_map[key] != path:
+            duplicate_keys.add(key)
+            continue
+        id_map.setdefault(key, path)
+
+
+def build_id_index(paths, manifest=None, workers=1, text_cache_bytes=0, known=None):
+    # Topics whose size and mtime match the persisted index are not read.
+    # Scans fan out to the pool; fragments are merged here in walk order so
+    # first-seen ownership and duplicate detection match a serial scan.
+    known = known or {}
+    records = {}
+    scanned = set()
+    texts = {}
+    cached_bytes = 0
+
+    pending = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            pending.append(path)
+            continue
+        record = known.get(path)
+        if (
+            record is not None
+            and record["mtime_ns"] == stat.st_mtime_ns
+            and record["size"] == stat.st_size
+        ):
+            records[path] = record
+            continue
+        entry = dita_manifest.lookup(manifest, path)
+        if entry is not None and not entry["xrefs"]:
+            lang = lang_from_dita_path(path) or entry["lang"]
+            records[path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": None,
+                "lang": lang,
+                "ids": entry["ids"] if lang else [],
+                "targets": [],
+            }
+            scanned.add(path)
+            continue
+        pending.append(path)
+    for path, (record, text) in zip(pending, parallel.parallel_map(scan_topic, pending, workers)):
+        if record is None:
+            continue
+        records[path] = record
+        scanned.add(path)
+        if text is not None and cached_bytes + len(text) <= text_cache_bytes:
+            texts[path] = text
+            cached_bytes += len(text)
+
     id_map = {}
     duplicate_keys = set()
+    ordered = {}
+    for path in paths:
+        record = records.get(path)
+        if record is None:
+            record = {"lang": None, "ids": [], "targets": []}
+        ordered[path] = record
+        if record["lang"]:
+            index_ids(id_map, duplicate_keys, path, record["lang"], record["ids"])
+
+    return id_map, duplicate_keys, ordered, scanned, texts
+
+
+def resolve_targets(path, lang, targets, id_map, duplicate_keys):
+    # Mirrors rewrite_text's decisions without the text; None means at
+    # least one target now resolves to another topic and needs rewriting.
+    outcome = {
+        "updated": 0,
+        "unchanged": 0,
+        "missing": 0,
+        "ambiguous": 0,
+        "missing_ids": set(),
+        "ambiguous_ids": set(),
+        "changed": False,
+    }
+    for target_id in targets:
+        key = (lang, target_id)
+        if key in duplicate_keys:
+            outcome["ambiguous"] += 1
+            outcome["ambiguous_ids"].add(target_id)
+            continue
+        target_path = id_map.get(key)
+        if not target_path:
+            outcome["missing"] += 1
+            outcome["missing_ids"].add(target_id)
+            continue
+        if _normalized(target_path) != _normalized(path):
+            return None
+        outcome["unchanged"] += 1
+    return outcome
+
+
+@functools.lru_cache(maxsize=65536)
+def _normalized(path):
+    return os.path.normcase(os.path.abspath(path))
 
-    for path, lang in files:
-        text = _read_text(path)
-        for id_value in ID_RE.findall(text):
-            key = (lang, id_value.upper())
-            if key in id_map and id_map[key] != path:
-                duplicate_keys.add(key)
-                continue
-            id_map.setdefault(key, path)
 
-    return id_map, duplicate_keys
+@functools.lru_cache(maxsize=65536)
+def _relative_dir(target_dir, source_dir):
+    return os.path.relpath(target_dir, start=source_dir).replace("\\", "/")
 
 
-def update_dita_file(path, lang, id_map, duplicate_keys, dry_run):
-    text = _read_text(path)
+def _relative_href(target_path, path):
+    rel_dir = _relative_dir(os.path.dirname(target_path), os.path.dirname(path))
+    name = os.path.basename(target_path)
+    return name if rel_dir == "." else f"{rel_dir}/{name}"
+
+
+def rewrite_text(path, text, lang, id_map, duplicate_keys):
     updates = 0
     unchanged = 0
     missing = 0
@@ -112,13 +244,11 @@ def update_dita_file(path, lang, id_map, duplicate_keys, dry_run):
             missing_ids.add(lookup_id)
             return match.group(0)
 
-        if os.path.normcase(os.path.abspath(target_path)) == os.path.normcase(os.path.abspath(path)):
+        if _normalized(target_path) == _normalized(path):
             unchanged += 1
             return match.group(0)
 
-        rel_path = os.path.relpath(target_path, start=os.path.dirname(path))
-        rel_path = rel_path.replace("\\", "/")
-        new_href = f"{rel_path}#{target_id}"
+        new_href = f"{_relative_href(target_path, path)}#{target_id}"
         if href == new_href:
             unchanged += 1
             return match.group(0)
@@ -127,10 +257,7 @@ def update_dita_file(path, lang, id_map, duplicate_keys, dry_run):
         return f"{match.group('prefix')}{new_href}{match.group('suffix')}"
 
     updated_text = XREF_HREF_RE.sub(replacer, text)
-    if updated_text != text and not dry_run:
-        _write_text(path, updated_text)
-
-    return {
+    return updated_text, {
         "updated": updates,
         "unchanged": unchanged,
         "missing": missing,
@@ -141,35 +268,120 @@ def update_dita_file(path, lang, id_map, duplicate_keys, dry_run):
     }
 
 
+def update_dita_file(path, lang, id_map, duplicate_keys, dry_run, text=None):
+    if text is None:
+        text = _read_text(path)
+    updated_text, result = rewrite_text(path, text, lang, id_map, duplicate_keys)
+    if result["changed"] and not dry_run:
+        fileio.write_text_if_changed(path, updated_text)
+    return result
+
+
+def _init_rewriter(id_map, duplicate_keys, dry_run):
+    _REWRITE["id_map"] = id_map
+    _REWRITE["duplicate_keys"] = duplicate_keys
+    _REWRITE["dry_run"] = dry_run
+
+
+def _rewrite_topic(task):
+    path, lang, text = task
+    if text is None:
+        text = _read_text(path)
+    updated_text, result = rewrite_text(
+        path, text, lang, _REWRITE["id_map"], _REWRITE["duplicate_keys"]
+    )
+    written = None
+    if result["changed"] and not _REWRITE["dry_run"]:
+        fileio.write_text_if_changed(path, updated_text)
+        stat = os.stat(path)
+        written = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": _digest(updated_text),
+            "targets": raw_targets(updated_text),
+        }
+    return path, result, written
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Replace DITA xref href fragments with relative paths to target topics."
     )
     parser.add_argument(
         "--xslt-root",
-        required=True,
-        help="Root path to xslt_output.",
+        default=None,
+        help="Root path to xslt_output (defaults to the job workspace with --job).",
     )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="Report changes without writing.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to CPU count; 1 runs in-process).",
+    )
+    parser.add_argument(
+        "--text-cache-mb",
+        type=int,
+        default=DEFAULT_TEXT_CACHE_MB,
+        help="Memory for keeping topic text between the index and rewrite phases.",
+    )
+    parser.add_argument(
+        "--index-db",
+        default=None,
+        help="Persistent id index (defaults to <xslt-root>/_tmp/xref_index.sqlite).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the persisted index and rescan every topic.",
+    )
+    workspace.add_job_arguments(parser)
 
     args = parser.parse_args()
+    try:
+        workspace.apply_job_defaults(args, xslt_root="xslt_output")
+    except ValueError as exc:
+        print(f"ERROR:{exc}")
+        return 2
+    if not args.xslt_root:
+        print("ERROR:--xslt-root or --job is required.")
+        return 2
     xslt_root = os.path.abspath(args.xslt_root)
 
     if not os.path.isdir(xslt_root):
         print(f"ERROR:XSLT root not found: {xslt_root}")
         return 2
 
-    files, missing_lang = collect_dita_files(xslt_root)
+    workers = max(1, args.workers or parallel.default_workers())
+    manifest = dita_manifest.load(xslt_root)
+    paths = collect_dita_files(xslt_root)
+    index_conn = xref_index.open_index(args.index_db or xref_index.default_path(xslt_root))
+    known = {}
+    if not args.full:
+        known = {
+            os.path.join(xslt_root, *relative.split("/")): record
+            for relative, record in xref_index.load_topics(index_conn).items()
+        }
+    id_map, duplicate_keys, records, scanned, texts = build_id_index(
+        paths,
+        manifest,
+        workers,
+        max(args.text_cache_mb, 0) * 1024 * 1024,
+        known,
+    )
+    topics_scanned = len(scanned)
+    files = [path for path, record in records.items() if record["lang"]]
+    missing_lang = len(records) - len(files)
     if not files:
+        index_conn.close()
         print("ERROR:No DITA files found under XSLT root.")
         return 2
-
-    id_map, duplicate_keys = build_id_index(files)
     if not id_map:
+        index_conn.close()
         print("ERROR:No X_ IDs found under XSLT root.")
         return 2
 
@@ -181,17 +393,51 @@ def main():
     missing_ids = set()
     ambiguous_ids = set()
 
-    for path, lang in files:
-        result = update_dita_file(path, lang, id_map, duplicate_keys, args.dry_run)
+    def add_result(result):
+        nonlocal files_changed, xrefs_updated, xrefs_unchanged, xrefs_missing, xrefs_ambiguous
         xrefs_updated += result["updated"]
         xrefs_unchanged += result["unchanged"]
         xrefs_missing += result["missing"]
         xrefs_ambiguous += result["ambiguous"]
-        missing_ids |= result["missing_ids"]
-        ambiguous_ids |= result["ambiguous_ids"]
+        missing_ids.update(result["missing_ids"])
+        ambiguous_ids.update(result["ambiguous_ids"])
         if result["changed"]:
             files_changed += 1
 
+    # Only topics with a target that now resolves to another topic are
+    # read again; the rest are accounted for from their indexed targets.
+    tasks = []
+    for path in files:
+        record = records[path]
+        outcome = resolve_targets(path, record["lang"], record["targets"], id_map, duplicate_keys)
+        if outcome is None:
+            tasks.append((path, record["lang"], texts.pop(path, None)))
+        else:
+            add_result(outcome)
+    for path, result, written in parallel.parallel_map(
+        _rewrite_topic,
+        tasks,
+        workers,
+        initializer=_init_rewriter,
+        initargs=(id_map, duplicate_keys, args.dry_run),
+    ):
+        add_result(result)
+        if written is not None:
+            records[path] = {**records[path], **written}
+            scanned.add(path)
+
+    def relative(path):
+        return os.path.relpath(path, xslt_root).replace(os.sep, "/")
+
+    current = {relative(path) for path in paths}
+    xref_index.save_topics(
+        index_conn,
+        {relative(path): records[path] for path in scanned},
+        [path for path in map(relative, known) if path not in current],
+        reset=args.full,
+    )
+    index_conn.close()
+
     stats = {
         "xslt_root": xslt_root,
         "dita_files": len(files),
@@ -202,6 +448,9 @@ def main():
         "xrefs_ambiguous_target": xrefs_ambiguous,
         "duplicate_ids": len(duplicate_keys),
         "missing_lang_files": missing_lang,
+        "manifest": manifest is not None,
+        "topics_scanned": topics_scanned,
+        "topics_rewritten": len(tasks),
         "dry_run": args.dry_run,
         "missing_target_ids": sorted(list(missing_ids))[:25],
         "ambiguous_target_ids": sorted(list(ambiguous_ids))[:25],
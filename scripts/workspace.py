@@ -0,0 +1,67 @@
+import os
+import re
+
+
+WORKSPACE_ROOT_ENV = "CONVERSION_WORKSPACE_ROOT"
+DEFAULT_WORKSPACE_ROOT = "workspaces"
+OUTPUT_DIRNAME = "output"
+XSLT_OUTPUT_DIRNAME = "xslt_output"
+_JOB_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+
+def workspace_root(root=None):
+    return os.path.abspath(
+        root or os.getenv(WORKSPACE_ROOT_ENV) or DEFAULT_WORKSPACE_ROOT
+    )
+
+
+def is_valid_job_id(job):
+    return bool(job) and bool(_JOB_ID_RE.match(job))
+
+
+def job_dir(job, root=None):
+    if not is_valid_job_id(job):
+        raise ValueError(f"Invalid job id: {job}")
+    return os.path.join(workspace_root(root), job)
+
+
+def job_paths(job, root=None):
+    return workspace_paths(job_dir(job, root))
+
+
+def workspace_paths(base):
+    base = os.path.abspath(base)
+    output = os.path.join(base, OUTPUT_DIRNAME)
+    xslt_output = os.path.join(base, XSLT_OUTPUT_DIRNAME)
+    return {
+        "root": base,
+        "output": output,
+        "xslt_output": xslt_output,
+        "blob_root": os.path.join(xslt_output, "blob", "master"),
+    }
+
+
+def add_job_arguments(parser, multiple=False):
+    parser.add_argument(
+        "--job",
+        action="append" if multiple else "store",
+        default=None,
+        help="Job namespace; paths default to <workspace-root>/<job>/..."
+        + (" (repeatable)." if multiple else "."),
+    )
+    parser.add_argument(
+        "--workspace-root",
+        default=None,
+        help=f"Root for job workspaces (defaults to ${WORKSPACE_ROOT_ENV} "
+        f"or ./{DEFAULT_WORKSPACE_ROOT}).",
+    )
+
+
+def apply_job_defaults(args, **defaults):
+    if not getattr(args, "job", None):
+        return None
+    paths = job_paths(args.job, args.workspace_root)
+    for attr, key in defaults.items():
+        if not getattr(args, attr, None):
+            setattr(args, attr, paths[key])
+    return paths
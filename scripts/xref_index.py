@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+
+
+INDEX_DIRNAME = "_tmp"
+INDEX_FILENAME = "xref_index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT,
+    lang TEXT,
+    ids TEXT NOT NULL,
+    targets TEXT NOT NULL
+);
+"""
+
+
+def default_path(xslt_root):
+    # _tmp is skipped by packaging and .dita relocation.
+    return os.path.join(xslt_root, INDEX_DIRNAME, INDEX_FILENAME)
+
+
+def open_index(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=60)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def load_topics(conn):
+    return {
+        path: {
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "hash": digest,
+            "lang": lang,
+            "ids": json.loads(ids),
+            "targets": json.loads(targets),
+        }
+        for path, mtime_ns, size, digest, lang, ids, targets in conn.execute(
+            "SELECT path, mtime_ns, size, hash, lang, ids, targets FROM topics"
+        )
+    }
+
+
+def save_topics(conn, records, removed, reset=False):
+    with conn:
+        if reset:
+            conn.execute("DELETE FROM topics")
+        conn.executemany("DELETE FROM topics WHERE path = ?", [(path,) for path in removed])
+        conn.executemany(
+            "INSERT OR REPLACE INTO topics (path, mtime_ns, size, hash, lang, ids, targets) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    path,
+                    record["mtime_ns"],
+                    record["size"],
+                    record["hash"],
+                    record["lang"],
+                    json.dumps(record["ids"]),
+                    json.dumps(record["targets"]),
+                )
+                for path, record in records.items()
+            ],
+        )
@@ -1,19 +1,40 @@
 import argparse
 import concurrent.futures
 import fnmatch
+import io
+import json
 import os
+import random
 import re
 import csv
 import shutil
 import sys
 import tempfile
+import threading
+import time
+import tracemalloc
 import uuid
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
 from html import entities as html_entities
 from html import unescape as html_unescape
 from multiprocessing import freeze_support, get_context
 from pathlib import Path
 from xml.etree import ElementTree
 
+import dita_manifest
+import fileio
+import job_queue
+import run_db
+import unzip
+import workspace
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
 XSLT_FILES = {
     "first": "Entity_Store.xsl",
     "second": "Entity_Parser.xsl",
@@ -26,6 +47,23 @@ DEFAULT_PATTERNS = ("xml", "*.xml")
 DTD_PLACEHOLDER = "<!-- placeholder DTD to satisfy the XML parser -->\n"
 MAP_FILENAME = "content.ditamap"
 REPORT_FILENAME = "invalid_richtext_report.csv"
+EVENT_MODES = ("text", "jsonl")
+DEFAULT_HEARTBEAT_INTERVAL = 2.0
+MEMORY_REPORT_FILENAME = "memory_profile.json"
+MEMORY_TOP_ALLOCATORS = 10
+MEMORY_TOP_SOURCES = 25
+COST_HISTORY_FILENAME = "xslt_pipeline_costs.json"
+DEFAULT_MEMORY_FACTOR = 24.0
+DEFAULT_WORKER_MEMORY_MB = 200
+DEFAULT_BUDGET_FRACTION = 0.75
+COST_HISTORY_ALPHA = 0.3
+COST_SAFETY_MARGIN = 1.25
+LOW_MEMORY_FRACTION = 0.10
+HIGH_MEMORY_FRACTION = 0.25
+DEFAULT_WATCH_INTERVAL = 1.0
+DEFAULT_WATCH_DEBOUNCE = 0.5
+RSS_SAMPLE_INTERVAL = 0.05
+ZIP_MEMBER_SEPARATOR = "!/"
 _AMP_ENTITY_RE = re.compile(
     br"&(?!(?:#\d+;|#x[0-9A-Fa-f]+;|[A-Za-z][A-Za-z0-9._-]*;))"
 )
@@ -77,6 +115,7 @@ _STRAY_FIELD_CLOSE_RE = re.compile(
 )
 
 _EXEC = {}
+_BASELINE_RSS = None
 
 
 def _as_dir_uri(path):
@@ -93,6 +132,405 @@ def _format_error(exc):
         return repr(exc)
 
 
+def _emit_event(event, **fields):
+    payload = {"event": event, "ts": round(time.time(), 3)}
+    payload.update(fields)
+    print(json.dumps(payload), flush=True)
+
+
+def _log_step(source_path, stage, phase, step_logs, events):
+    if events == "jsonl":
+        if step_logs:
+            _emit_event("step", source=str(source_path), stage=stage, phase=phase)
+        return
+    if step_logs:
+        print(f"STEP:{source_path}:{stage}:{phase}")
+
+
+class ZipMemberSource(
+    namedtuple(
+        "ZipMemberSource",
+        "zip_path relative filename header_offset compress_type "
+        "compress_size file_size CRC flag_bits",
+    )
+):
+    # Carries the central-directory fields unzip.read_member needs, so a
+    # worker can pull its own member out of the archive.
+    __slots__ = ()
+
+    @classmethod
+    def from_info(cls, zip_path, relative, info):
+        return cls(
+            str(zip_path),
+            relative,
+            info.filename,
+            info.header_offset,
+            info.compress_type,
+            info.compress_size,
+            info.file_size,
+            info.CRC,
+            info.flag_bits,
+        )
+
+    @property
+    def name(self):
+        return Path(self.relative).name
+
+    def __str__(self):
+        return f"{self.zip_path}{ZIP_MEMBER_SEPARATOR}{self.relative}"
+
+
+def _file_size(path):
+    if isinstance(path, ZipMemberSource):
+        return path.file_size
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _current_rss():
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as handle:
+            pages = int(handle.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return value
+    return value * 1024
+
+
+def _rss_high_water():
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_rss_high_water():
+    # Linux 4.0+: writing 5 resets VmHWM to the current RSS.
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as handle:
+            handle.write("5")
+    except OSError:
+        return False
+    return _rss_high_water() is not None
+
+
+def _start_peak_rss():
+    # ru_maxrss is the worker's lifetime peak, so a job lighter than an
+    # earlier one would report nothing. Reset the high-water mark per job,
+    # else sample RSS while the job runs.
+    if _reset_rss_high_water():
+        return {"kind": "hwm"}
+    peak = _current_rss()
+    if peak is None:
+        return {"kind": "maxrss", "before": _max_rss()}
+    tracker = {"kind": "sample", "peak": peak, "stop": threading.Event()}
+
+    def sample():
+        while not tracker["stop"].wait(RSS_SAMPLE_INTERVAL):
+            tracker["peak"] = max(tracker["peak"], _current_rss() or 0)
+
+    tracker["thread"] = threading.Thread(target=sample, daemon=True)
+    tracker["thread"].start()
+    return tracker
+
+
+def _stop_peak_rss(tracker):
+    if tracker["kind"] == "hwm":
+        return _rss_high_water()
+    if tracker["kind"] == "sample":
+        tracker["stop"].set()
+        tracker["thread"].join()
+        return max(tracker["peak"], _current_rss() or 0)
+    after = _max_rss()
+    if tracker["before"] is None or after is None or after <= tracker["before"]:
+        return None
+    return after
+
+
+def _system_memory():
+    try:
+        import psutil
+
+        info = psutil.virtual_memory()
+        return info.total, info.available
+    except Exception:
+        pass
+    try:
+        values = {}
+        with open("/proc/meminfo", "r", encoding="ascii") as handle:
+            for line in handle:
+                key, _, rest = line.partition(":")
+                values[key] = int(rest.split()[0]) * 1024
+        return values["MemTotal"], values.get("MemAvailable", values.get("MemFree"))
+    except (OSError, ValueError, KeyError, IndexError):
+        return None, None
+
+
+def _size_bucket(size):
+    return str(max(int(size), 1).bit_length())
+
+
+def _load_cost_history(path):
+    if not path:
+        return {"ratios": {}}
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"ratios": {}}
+    if not isinstance(data, dict) or not isinstance(data.get("ratios"), dict):
+        return {"ratios": {}}
+    return data
+
+
+def _save_cost_history(path, history):
+    if not path:
+        return
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        temp_path = Path(f"{path}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(history), encoding="utf-8")
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def _record_job_cost(history, size, peak_bytes):
+    if not size or not peak_bytes or peak_bytes <= 0:
+        return
+    ratio = peak_bytes / size
+    ratios = history["ratios"]
+    bucket = _size_bucket(size)
+    previous = ratios.get(bucket)
+    if previous is None:
+        ratios[bucket] = ratio
+    else:
+        ratios[bucket] = previous + COST_HISTORY_ALPHA * (ratio - previous)
+
+
+def _estimate_job_memory(size, history, worker_bytes):
+    ratios = history["ratios"]
+    ratio = ratios.get(_size_bucket(size))
+    if ratio is None and ratios:
+        nearest = min(ratios, key=lambda key: abs(int(key) - int(_size_bucket(size))))
+        ratio = ratios[nearest]
+    if ratio is None:
+        ratio = DEFAULT_MEMORY_FACTOR
+    return int(worker_bytes + size * ratio * COST_SAFETY_MARGIN)
+
+
+def _new_governor(workers, budget_bytes, history, worker_bytes):
+    return {
+        "max_workers": workers,
+        "limit": workers,
+        "budget": budget_bytes,
+        "history": history,
+        "worker_bytes": worker_bytes,
+        "reserved": 0,
+        "reservations": {},
+    }
+
+
+def _next_admissible(queue, governor):
+    if not governor["reservations"]:
+        return 0
+    budget = governor["budget"]
+    for idx, (_, _, estimate, _) in enumerate(queue):
+        if not budget or governor["reserved"] + estimate <= budget:
+            return idx
+    return None
+
+
+def _admit_jobs(executor, queue, governor, future_map):
+    while queue and len(governor["reservations"]) < governor["limit"]:
+        idx = _next_admissible(queue, governor)
+        if idx is None:
+            break
+        job, size, estimate, key = queue.pop(idx)
+        future = executor.submit(_run_pipeline, job)
+        future_map[future] = key
+        governor["reservations"][future] = (size, estimate)
+        governor["reserved"] += estimate
+
+
+def _release_job(governor, future, peak_bytes):
+    size, estimate = governor["reservations"].pop(future, (0, 0))
+    governor["reserved"] -= estimate
+    if peak_bytes:
+        _record_job_cost(governor["history"], size, peak_bytes)
+
+
+def _adjust_concurrency(governor):
+    total, available = _system_memory()
+    if not total or available is None:
+        return False
+    limit = governor["limit"]
+    if available < total * LOW_MEMORY_FRACTION and limit > 1:
+        governor["limit"] = limit - 1
+    elif available > total * HIGH_MEMORY_FRACTION and limit < governor["max_workers"]:
+        governor["limit"] = limit + 1
+    return governor["limit"] != limit
+
+
+def _new_memory_profile(source_path):
+    return {"source": str(source_path), "stages": [], "top_allocators": []}
+
+
+@contextmanager
+def _measure_python_stage(profile, stage):
+    if profile is None:
+        yield
+        return
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        profile["stages"].append(
+            {"stage": stage, "kind": "python", "peak_bytes": max(peak - base, 0)}
+        )
+
+
+@contextmanager
+def _measure_saxon_stage(profile, stage):
+    if profile is None:
+        yield
+        return
+    rss_before = _current_rss()
+    max_before = _max_rss()
+    try:
+        yield
+    finally:
+        rss_after = _current_rss()
+        max_after = _max_rss()
+        entry = {"stage": stage, "kind": "saxon"}
+        if rss_before is not None and rss_after is not None:
+            entry["rss_delta_bytes"] = rss_after - rss_before
+        if max_before is not None and max_after is not None:
+            entry["peak_rss_growth_bytes"] = max_after - max_before
+        profile["stages"].append(entry)
+
+
+@contextmanager
+def _measure_stage(durations, profile, stage, kind):
+    measure = _measure_python_stage if kind == "python" else _measure_saxon_stage
+    started = time.perf_counter()
+    try:
+        with measure(profile, stage):
+            yield
+    finally:
+        durations[stage] = round(time.perf_counter() - started, 4)
+
+
+def _record_top_allocators(profile, label):
+    if profile is None or not tracemalloc.is_tracing():
+        return
+    stats = tracemalloc.take_snapshot().statistics("lineno")
+    for stat in stats[:MEMORY_TOP_ALLOCATORS]:
+        frame = stat.traceback[0]
+        profile["top_allocators"].append(
+            {
+                "label": label,
+                "site": f"{frame.filename}:{frame.lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+        )
+
+
+def _profile_peak(profile):
+    peak = 0
+    for entry in profile["stages"]:
+        peak = max(
+            peak,
+            entry.get("peak_bytes", 0),
+            entry.get("rss_delta_bytes", 0),
+            entry.get("peak_rss_growth_bytes", 0),
+        )
+    return peak
+
+
+def _write_memory_report(output_root, profiles, sampled, total):
+    stages = {}
+    allocators = {}
+    sources = []
+    for profile in profiles:
+        sources.append(
+            {
+                "source": profile["source"],
+                "peak_bytes": _profile_peak(profile),
+                "stages": profile["stages"],
+            }
+        )
+        for entry in profile["stages"]:
+            bucket = stages.setdefault(
+                entry["stage"],
+                {"kind": entry["kind"], "samples": 0, "max_bytes": 0, "total_bytes": 0},
+            )
+            value = max(
+                entry.get("peak_bytes", 0),
+                entry.get("rss_delta_bytes", 0),
+                entry.get("peak_rss_growth_bytes", 0),
+            )
+            bucket["samples"] += 1
+            bucket["max_bytes"] = max(bucket["max_bytes"], value)
+            bucket["total_bytes"] += value
+        for entry in profile["top_allocators"]:
+            key = (entry["label"], entry["site"])
+            bucket = allocators.setdefault(
+                key,
+                {
+                    "label": entry["label"],
+                    "site": entry["site"],
+                    "max_bytes": 0,
+                    "total_bytes": 0,
+                    "samples": 0,
+                },
+            )
+            bucket["max_bytes"] = max(bucket["max_bytes"], entry["size_bytes"])
+            bucket["total_bytes"] += entry["size_bytes"]
+            bucket["samples"] += 1
+
+    for bucket in stages.values():
+        bucket["avg_bytes"] = bucket["total_bytes"] // max(bucket["samples"], 1)
+        del bucket["total_bytes"]
+
+    sources.sort(key=lambda entry: entry["peak_bytes"], reverse=True)
+    top_allocators = sorted(
+        allocators.values(), key=lambda entry: entry["max_bytes"], reverse=True
+    )
+    report = {
+        "sampled_jobs": sampled,
+        "total_jobs": total,
+        "stages": stages,
+        "heaviest_sources": sources[:MEMORY_TOP_SOURCES],
+        "top_allocators": top_allocators[:MEMORY_TOP_ALLOCATORS * 2],
+    }
+    report_path = Path(output_root, MEMORY_REPORT_FILENAME)
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report_path
+
+
 def _ensure_concept_dtd(dir_path):
     dtd_path = Path(dir_path, "concept.dtd")
     if dtd_path.exists():
@@ -359,14 +797,16 @@ def _fix_stray_field_closers(file_path):
     return True
 
 
-def _collect_rich_text_issues(source_path):
+def _collect_rich_text_issues(source_path, profile=None, source_label=None):
+    source_label = source_label or str(source_path)
     issues = []
     try:
         tree = ElementTree.parse(source_path)
+        _record_top_allocators(profile, "lint_parse")
     except Exception as exc:
         return [
             {
-                "source_file": str(source_path),
+                "source_file": source_label,
                 "item_id": "",
                 "item_name": "",
                 "field_key": "",
@@ -393,7 +833,7 @@ def _collect_rich_text_issues(source_path):
             if issue_list:
                 issues.append(
                     {
-                        "source_file": str(source_path),
+                        "source_file": source_label,
                         "item_id": item_id,
                         "item_name": item_name,
                         "field_key": field_key,
@@ -488,7 +928,7 @@ def _write_ditamap(output_dir):
 
 
 def _init_worker(xslt_dir):
-    global _EXEC
+    global _EXEC, _BASELINE_RSS
     try:
         from saxonche import PySaxonProcessor
     except Exception as exc:
@@ -504,30 +944,42 @@ def _init_worker(xslt_dir):
         stylesheet_path = str(Path(xslt_dir, name).resolve())
         compiled[key] = xslt.compile_stylesheet(stylesheet_file=stylesheet_path)
     _EXEC = compiled
+    _BASELINE_RSS = _current_rss()
 
 
-def _ensure_clean_dir(path, overwrite):
+def _check_output_dir(path, overwrite):
     path = Path(path)
-    if path.exists():
-        if not overwrite:
-            raise RuntimeError(f"Output directory exists: {path}")
-        shutil.rmtree(path)
-    path.mkdir(parents=True, exist_ok=True)
+    if path.exists() and not overwrite:
+        raise RuntimeError(f"Output directory exists: {path}")
     return path
 
 
 def _copy_source_as_xml(source_path, temp_dir):
     target = Path(temp_dir, "xml")
-    shutil.copy2(source_path, target)
+    if isinstance(source_path, ZipMemberSource):
+        target.write_bytes(unzip.read_member(source_path.zip_path, source_path))
+    else:
+        shutil.copy2(source_path, target)
     return target
 
 
-def _copy_source_to_output(source_path, output_dir):
-    output_path = Path(output_dir, Path(source_path).name)
-    shutil.copy2(source_path, output_path)
+def _copy_source_to_output(source_path, read_path, output_dir):
+    output_path = Path(output_dir, source_path.name)
+    shutil.copy2(read_path, output_path)
     return output_path
 
 
+def _renew_lease(lease):
+    # Queue jobs renew their lease right before writing, so a worker that
+    # lost the job never writes over the output of the one that took it.
+    queue_db, job_id, owner, lease_seconds = lease
+    conn = job_queue.open_queue(queue_db)
+    try:
+        return job_queue.renew(conn, job_id, owner, lease_seconds)
+    finally:
+        conn.close()
+
+
 def _run_pipeline(args):
     (
         source_path,
@@ -536,75 +988,111 @@ def _run_pipeline(args):
         keep_temp,
         overwrite,
         step_logs,
+        events,
+        profile_memory,
+        describe_outputs,
+        lease,
     ) = args
 
+    started = time.perf_counter()
+    input_bytes = _file_size(source_path)
+    rss_tracker = _start_peak_rss()
+    if events == "jsonl":
+        _emit_event("job_start", source=str(source_path), input_bytes=input_bytes)
+
+    profile = None
+    if profile_memory:
+        profile = _new_memory_profile(source_path)
+        tracemalloc.start()
+
     temp_dir = Path(temp_root, f"job_{uuid.uuid4().hex}")
     temp_dir.mkdir(parents=True, exist_ok=True)
     _ensure_concept_dtd(temp_dir)
 
     error = None
-    rich_text_issues = _collect_rich_text_issues(source_path)
+    durations = {}
+    rich_text_issues = []
+    topics = None
     output_str = str(output_dir)
+    writes = None
     try:
-        if step_logs:
-            print(f"STEP:{source_path}:first:start")
-        _copy_source_as_xml(source_path, temp_dir)
+        # Zip members only ever exist as this temp copy, so lint and the
+        # first stage read it instead of the original source.
+        read_path = _copy_source_as_xml(source_path, temp_dir)
+        if not isinstance(source_path, ZipMemberSource):
+            read_path = Path(source_path)
+        with _measure_stage(durations, profile, "lint", "python"):
+            rich_text_issues = _collect_rich_text_issues(
+                read_path, profile, source_label=str(source_path)
+            )
+        _log_step(source_path, "first", "start", step_logs, events)
 
         step_01 = temp_dir / "01.xml"
         step_02 = temp_dir / "02.xml"
         xml_dita = temp_dir / "xml.dita"
 
-        _EXEC["first"].transform_to_file(
-            source_file=str(source_path),
-            output_file=str(step_01),
-        )
-        if step_logs:
-            print(f"STEP:{source_path}:first:done")
-            print(f"STEP:{source_path}:second:start")
-        _EXEC["second"].transform_to_file(
-            source_file=str(step_01),
-            output_file=str(step_02),
-        )
-        if step_logs:
-            print(f"STEP:{source_path}:second:done")
-        _sanitize_xml_entities(step_02)
-        _normalize_html_entities(step_02)
-        _sanitize_xml_text(step_02)
-        _fix_empty_paragraphs(step_02)
-        _close_unterminated_paragraphs(step_02)
-        _balance_content_blocks(step_02)
-        _fix_stray_field_closers(step_02)
-        if step_logs:
-            print(f"STEP:{source_path}:third:start")
-        _EXEC["third"].transform_to_file(
-            source_file=str(step_02),
-            output_file=str(xml_dita),
-        )
-        if step_logs:
-            print(f"STEP:{source_path}:third:done")
+        with _measure_stage(durations, profile, "first", "saxon"):
+            _EXEC["first"].transform_to_file(
+                source_file=str(read_path),
+                output_file=str(step_01),
+            )
+        _log_step(source_path, "first", "done", step_logs, events)
+        _log_step(source_path, "second", "start", step_logs, events)
+        with _measure_stage(durations, profile, "second", "saxon"):
+            _EXEC["second"].transform_to_file(
+                source_file=str(step_01),
+                output_file=str(step_02),
+            )
+        _log_step(source_path, "second", "done", step_logs, events)
+        with _measure_stage(durations, profile, "fixers", "python"):
+            _sanitize_xml_entities(step_02)
+            _normalize_html_entities(step_02)
+            _sanitize_xml_text(step_02)
+            _fix_empty_paragraphs(step_02)
+            _close_unterminated_paragraphs(step_02)
+            _balance_content_blocks(step_02)
+            _fix_stray_field_closers(step_02)
+        _log_step(source_path, "third", "start", step_logs, events)
+        with _measure_stage(durations, profile, "third", "saxon"):
+            _EXEC["third"].transform_to_file(
+                source_file=str(step_02),
+                output_file=str(xml_dita),
+            )
+        _log_step(source_path, "third", "done", step_logs, events)
 
-        output_dir = _ensure_clean_dir(output_dir, overwrite)
+        output_dir = _check_output_dir(output_dir, overwrite)
         output_str = str(output_dir)
-        _ensure_concept_dtd(output_dir)
-        _copy_source_to_output(source_path, output_dir)
-
-        if step_logs:
-            print(f"STEP:{source_path}:fourth:start")
-        _EXEC["fourth"].set_base_output_uri(_as_dir_uri(output_dir))
-        _EXEC["fourth"].transform_to_file(
-            source_file=str(xml_dita),
-            output_file=str(Path(output_dir, "xml.dita")),
-        )
-        if step_logs:
-            print(f"STEP:{source_path}:fourth:done")
-            print(f"STEP:{source_path}:final:start")
-        _cleanup_before_final(output_dir)
-        final_count = _run_final_on_outputs(output_dir)
+        # The last two stages build the outputs in the job's temp dir; only
+        # files whose bytes differ from the existing output are then written.
+        staging_dir = temp_dir / "output"
+        staging_dir.mkdir()
+        _ensure_concept_dtd(staging_dir)
+        _copy_source_to_output(source_path, read_path, staging_dir)
+
+        _log_step(source_path, "fourth", "start", step_logs, events)
+        with _measure_stage(durations, profile, "fourth", "saxon"):
+            _EXEC["fourth"].set_base_output_uri(_as_dir_uri(staging_dir))
+            _EXEC["fourth"].transform_to_file(
+                source_file=str(xml_dita),
+                output_file=str(Path(staging_dir, "xml.dita")),
+            )
+        _log_step(source_path, "fourth", "done", step_logs, events)
+        _log_step(source_path, "final", "start", step_logs, events)
+        _cleanup_before_final(staging_dir)
+        with _measure_stage(durations, profile, "final", "saxon"):
+            final_count = _run_final_on_outputs(staging_dir)
         if final_count == 0:
             raise RuntimeError("No .dita outputs found after fourth.xsl")
-        if step_logs:
-            print(f"STEP:{source_path}:final:done")
-        _cleanup_after_final(output_dir)
+        _log_step(source_path, "final", "done", step_logs, events)
+        _cleanup_after_final(staging_dir)
+        if lease is not None and not _renew_lease(lease):
+            raise RuntimeError("Lease lost; outputs left to the job's new owner")
+        with _measure_stage(durations, profile, "write", "python"):
+            # A flat output dir is shared by every source, so nothing is pruned there.
+            writes = fileio.sync_tree(staging_dir, output_dir, prune=describe_outputs)
+        if describe_outputs:
+            with _measure_stage(durations, profile, "manifest", "python"):
+                topics = dita_manifest.describe_outputs(output_dir)
     except Exception as exc:
         if _is_warning_only_message(str(exc)):
             error = None
@@ -613,16 +1101,75 @@ def _run_pipeline(args):
     finally:
         if not keep_temp:
             shutil.rmtree(temp_dir, ignore_errors=True)
+        if profile is not None:
+            tracemalloc.stop()
+
+    metrics = {
+        "input_bytes": input_bytes,
+        # From the write stage: walking the output would rescan a shared
+        # flat output dir once per job.
+        "output_bytes": writes["bytes"] if writes is not None and not error else 0,
+        "duration": round(time.perf_counter() - started, 3),
+        "stages": durations,
+    }
+    if writes is not None:
+        metrics["files_written"] = writes["written"]
+        metrics["files_unchanged"] = writes["unchanged"]
+        metrics["files_removed"] = writes["removed"]
+    peak_rss = _stop_peak_rss(rss_tracker)
+    if _BASELINE_RSS is not None and peak_rss is not None and peak_rss > _BASELINE_RSS:
+        metrics["peak_rss_bytes"] = peak_rss - _BASELINE_RSS
+    if events == "jsonl":
+        _emit_event(
+            "job_finish",
+            source=str(source_path),
+            output=output_str,
+            status="error" if error else "ok",
+            error=error,
+            rich_text_issues=len(rich_text_issues),
+            **metrics,
+        )
+    if profile is not None:
+        metrics["memory"] = profile
+    if topics is not None and not error:
+        metrics["topics"] = topics
 
-    return str(source_path), output_str, error, rich_text_issues
+    return str(source_path), output_str, error, rich_text_issues, metrics
 
 
 def _matches_patterns(name, patterns):
     return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
 
 
+def _is_zip_input(input_path):
+    return (
+        input_path.is_file()
+        and input_path.suffix.lower() == ".zip"
+        and zipfile.is_zipfile(input_path)
+    )
+
+
+def _collect_zip_inputs(zip_path, patterns):
+    # Members are planned the same way unzip.py would extract them, so the
+    # outputs line up with a run over the extracted tree.
+    error, infos, planned = unzip.plan_archive(str(zip_path))
+    if error:
+        raise RuntimeError(f"{zip_path}: {error}")
+    matches = []
+    for info in infos:
+        relative = planned.get(info.filename)
+        if relative is None or info.is_dir():
+            continue
+        relative = Path(relative).as_posix()
+        if _matches_patterns(Path(relative).name, patterns):
+            matches.append(ZipMemberSource.from_info(zip_path, relative, info))
+    return matches
+
+
 def _collect_inputs(input_path, patterns):
     input_path = Path(input_path)
+    if _is_zip_input(input_path):
+        return _collect_zip_inputs(input_path.resolve(), patterns), None
     if input_path.is_file():
         return [input_path], None
 
@@ -638,35 +1185,724 @@ def _collect_inputs(input_path, patterns):
 
 
 def _output_dir_for_input(source_path, input_root, output_root, flat_output):
-    source_path = Path(source_path)
     output_root = Path(output_root)
 
     if flat_output:
         return output_root
 
-    if input_root:
+    if isinstance(source_path, ZipMemberSource):
+        source_path = Path(source_path.relative)
+        parent = source_path.parent
+    elif input_root:
+        source_path = Path(source_path)
         relative = source_path.relative_to(input_root)
         parent = relative.parent
     else:
+        source_path = Path(source_path)
         parent = Path()
 
     stem = source_path.stem if source_path.suffix else source_path.name
     return output_root / parent / stem
 
 
-def _parse_args():
+def _prune_stale_outputs(output_root, output_dirs, keep):
+    # Each job prunes inside its own output dir, so unchanged topics keep
+    # their bytes and mtime. What no current source writes goes here: dirs
+    # of sources no longer in the input, and topics moved up out of source
+    # dirs (relocation), which would otherwise collide with the next move.
+    output_root = str(output_root)
+    kept = {os.path.normcase(str(path)) for path in output_dirs}
+    parents = set()
+    for path in output_dirs:
+        parent = os.path.dirname(str(path))
+        while len(parent) > len(output_root):
+            parents.add(os.path.normcase(parent))
+            parent = os.path.dirname(parent)
+
+    removed = 0
+
+    def prune(dir_path, top):
+        nonlocal removed
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            return
+        for entry in entries:
+            key = os.path.normcase(entry.path)
+            if entry.is_dir(follow_symlinks=False):
+                if key in kept or (top and entry.name in keep):
+                    continue
+                if key in parents:
+                    prune(entry.path, False)
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+            elif not top and entry.name.lower().endswith(".dita"):
+                os.unlink(entry.path)
+                removed += 1
+
+    prune(output_root, True)
+    return removed
+
+
+def _heartbeat_fields(progress, in_flight):
+    elapsed = max(time.perf_counter() - progress["started"], 1e-6)
+    completed = progress["completed"]
+    bytes_done = progress["bytes_done"]
+    files_per_sec = completed / elapsed
+    bytes_per_sec = bytes_done / elapsed
+    remaining_files = progress["total_files"] - completed
+    remaining_bytes = max(progress["total_bytes"] - bytes_done, 0)
+    eta = None
+    if remaining_files <= 0:
+        eta = 0.0
+    elif bytes_per_sec > 0 and remaining_bytes:
+        eta = remaining_bytes / bytes_per_sec
+    elif files_per_sec > 0:
+        eta = remaining_files / files_per_sec
+    return {
+        "elapsed": round(elapsed, 3),
+        "completed": completed,
+        "failed": progress["failed"],
+        "total": progress["total_files"],
+        "in_flight": in_flight,
+        "files_per_sec": round(files_per_sec, 3),
+        "mb_per_sec": round(bytes_per_sec / (1024 * 1024), 3),
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+    }
+
+
+def _write_rich_text_report(output_root, issues):
+    report_path = Path(output_root) / REPORT_FILENAME
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    writer.writerow(
+        ["source_file", "item_id", "item_name", "field_key", "issues", "snippet"]
+    )
+    for entry in issues:
+        writer.writerow(
+            [
+                entry["source_file"],
+                entry["item_id"],
+                entry["item_name"],
+                entry["field_key"],
+                entry["issues"],
+                entry["snippet"],
+            ]
+        )
+    fileio.write_text_if_changed(str(report_path), buffer.getvalue())
+    return report_path
+
+
+def _resolve_batches(args):
+    batches = []
+    for job in args.job or []:
+        paths = workspace.job_paths(job, args.workspace_root)
+        batches.append(
+            {"label": job, "input": paths["output"], "output_root": paths["xslt_output"]}
+        )
+
+    inputs = args.input or []
+    if inputs and not args.output_dir:
+        raise RuntimeError("--output-dir is required with --input")
+    if len(inputs) == 1 and not batches:
+        batches.append({"label": None, "input": inputs[0], "output_root": args.output_dir})
+    else:
+        used = set()
+        for input_path in inputs:
+            resolved = Path(input_path).resolve()
+            name = resolved.name or "input"
+            if _is_zip_input(resolved):
+                name = resolved.stem
+            label = name
+            index = 1
+            while label in used:
+                index += 1
+                label = f"{name}_{index}"
+            used.add(label)
+            batches.append(
+                {
+                    "label": label,
+                    "input": input_path,
+                    "output_root": str(Path(args.output_dir, label)),
+                }
+            )
+
+    if not batches:
+        raise RuntimeError("Provide --input/--output-dir or at least one --job")
+    return batches
+
+
+def _source_key(source_path, input_root, label=None):
+    if isinstance(source_path, ZipMemberSource):
+        key = source_path.relative
+        return f"{label}/{key}" if label else key
+    source_path = Path(source_path)
+    if input_root:
+        try:
+            key = source_path.relative_to(input_root).as_posix()
+        except ValueError:
+            key = source_path.name
+    else:
+        key = source_path.name
+    return f"{label}/{key}" if label else key
+
+
+def _job_for_source(source_path, batch, args, overwrite=None):
+    return (
+        source_path,
+        _output_dir_for_input(
+            source_path, batch["input_root"], batch["output_root"], args.flat_output
+        ),
+        batch["temp_root"],
+        args.keep_temp,
+        args.overwrite if overwrite is None else overwrite,
+        args.step_logs,
+        args.events,
+        args.profile_memory and random.random() < args.profile_memory_sample,
+        not args.flat_output,
+        None,
+    )
+
+
+def _scan_sources(batches, patterns):
+    snapshot = {}
+    for batch in batches:
+        try:
+            sources, _ = _collect_inputs(batch["input"], patterns)
+        except RuntimeError:
+            continue
+        for source_path in sources:
+            try:
+                stat = os.stat(source_path)
+            except OSError:
+                continue
+            snapshot[str(source_path)] = (
+                (stat.st_mtime_ns, stat.st_size),
+                batch,
+                source_path,
+            )
+    return snapshot
+
+
+def _diff_snapshots(known, current):
+    changed = [
+        key
+        for key, entry in current.items()
+        if key not in known or known[key][0] != entry[0]
+    ]
+    deleted = [key for key in known if key not in current]
+    return changed, deleted
+
+
+def _wait_for_quiet(batches, patterns, current, debounce):
+    # A burst of writes (an export being copied in) settles before any job
+    # starts, so a half-written source is never transformed.
+    while True:
+        time.sleep(debounce)
+        later = _scan_sources(batches, patterns)
+        changed, deleted = _diff_snapshots(current, later)
+        if not changed and not deleted:
+            return later
+        current = later
+
+
+def _run_watch_cycle(executor, args, known, current, issues_by_source):
+    jsonl = args.events == "jsonl"
+    changed, deleted = _diff_snapshots(known, current)
+    started = time.perf_counter()
+
+    removed = 0
+    topics_by_batch = {}
+    for key in deleted:
+        _, batch, source_path = known[key]
+        issues_by_source.pop(key, None)
+        if args.flat_output:
+            continue
+        output_dir = _output_dir_for_input(
+            source_path, batch["input_root"], batch["output_root"], False
+        )
+        topics_by_batch.setdefault(id(batch), {})[str(output_dir)] = None
+        if output_dir.exists():
+            shutil.rmtree(output_dir, ignore_errors=True)
+            removed += 1
+            if jsonl:
+                _emit_event("output_removed", source=key, output=str(output_dir))
+            elif not args.quiet:
+                print(f"REMOVED:{key} -> {output_dir}")
+
+    future_map = {
+        executor.submit(
+            _run_pipeline, _job_for_source(current[key][2], current[key][1], args, True)
+        ): key
+        for key in changed
+    }
+    errors = 0
+    for future in concurrent.futures.as_completed(future_map):
+        key = future_map[future]
+        try:
+            result_source, output_dir, error, rich_text_issues, metrics = future.result()
+        except Exception as exc:
+            result_source, output_dir, rich_text_issues, metrics = key, None, [], {}
+            error = _format_error(exc)
+        issues_by_source[key] = rich_text_issues
+        if output_dir and not args.flat_output:
+            topics_by_batch.setdefault(id(current[key][1]), {})[output_dir] = metrics.get("topics")
+        if error:
+            errors += 1
+            if not jsonl:
+                print(f"ERROR:{result_source}: {error}")
+        elif not args.quiet and not jsonl:
+            print(f"OK:{result_source} -> {output_dir}")
+
+    batches = {id(entry[1]): entry[1] for entry in list(known.values()) + list(current.values())}
+    for batch in batches.values():
+        issues = [
+            entry
+            for key, entry_issues in issues_by_source.items()
+            if key in current and current[key][1] is batch
+            for entry in entry_issues
+        ]
+        report_path = Path(batch["output_root"]) / REPORT_FILENAME
+        if issues:
+            _write_rich_text_report(batch["output_root"], issues)
+        elif report_path.exists():
+            report_path.unlink()
+        if id(batch) in topics_by_batch:
+            dita_manifest.update(batch["output_root"], topics_by_batch[id(batch)])
+
+    duration = round(time.perf_counter() - started, 3)
+    if jsonl:
+        _emit_event(
+            "watch_cycle",
+            changed=len(changed),
+            removed=removed,
+            failed=errors,
+            duration=duration,
+        )
+    else:
+        print(f"WATCH:{len(changed)}:{removed}:{errors}")
+
+
+def _watch(args, batches, patterns, workers):
+    known = {}
+    issues_by_source = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.xslt_dir,),
+    ) as executor:
+        try:
+            while True:
+                current = _scan_sources(batches, patterns)
+                changed, deleted = _diff_snapshots(known, current)
+                if changed or deleted:
+                    if known:
+                        current = _wait_for_quiet(
+                            batches, patterns, current, args.watch_debounce
+                        )
+                    _run_watch_cycle(executor, args, known, current, issues_by_source)
+                    known = current
+                time.sleep(args.watch_interval)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def _merge_result(args, state, key, result, emit=False):
+    result_source, output_dir, error, rich_text_issues, metrics = result
+    progress = state["progress"]
+    progress["completed"] += 1
+    progress["bytes_done"] += metrics.get("input_bytes", 0)
+    progress["output_bytes"] += metrics.get("output_bytes", 0)
+    progress["files_written"] += metrics.get("files_written", 0)
+    progress["files_unchanged"] += metrics.get("files_unchanged", 0)
+    if error:
+        progress["failed"] += 1
+    batch, source_path = state["sources"][key]
+    if "memory" in metrics:
+        batch["memory_profiles"].append(metrics["memory"])
+    if rich_text_issues:
+        batch["issues"].extend(rich_text_issues)
+    if output_dir:
+        batch["topics"][output_dir] = metrics.get("topics")
+        if not error and state.get("on_output") is not None:
+            state["on_output"](output_dir, metrics.get("topics"))
+
+    db_conn = state["db_conn"]
+    if db_conn is not None:
+        run_db.record_result(
+            db_conn,
+            state["run_id"],
+            _source_key(
+                source_path,
+                batch["input_root"],
+                batch["label"] if state["multi_batch"] else None,
+            ),
+            result_source,
+            output_dir,
+            error,
+            len(rich_text_issues),
+            metrics,
+        )
+        state["recorded"] += 1
+        if state["recorded"] % run_db.COMMIT_EVERY == 0:
+            db_conn.commit()
+
+    if args.events == "jsonl":
+        if emit:
+            _emit_event(
+                "job_finish",
+                source=result_source,
+                output=output_dir,
+                status="error" if error else "ok",
+                error=error,
+                rich_text_issues=len(rich_text_issues),
+                **{
+                    key: value
+                    for key, value in metrics.items()
+                    if key not in ("memory", "topics")
+                },
+            )
+    elif error:
+        print(f"ERROR:{result_source}: {error}")
+    elif not args.quiet:
+        print(f"OK:{result_source} -> {output_dir}")
+    return error
+
+
+def _failed_result(source_path, exc):
+    return str(source_path), None, _format_error(exc), [], {}
+
+
+def _run_local(args, queue, governor, state, workers, budget_bytes):
+    jsonl = args.events == "jsonl"
+    progress = state["progress"]
+    errors = 0
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.xslt_dir,),
+    ) as executor:
+        future_map = {}
+        _admit_jobs(executor, queue, governor, future_map)
+        pending = set(future_map)
+        stop = False
+        next_heartbeat = time.perf_counter() + args.heartbeat_interval
+        while pending and not stop:
+            timeout = None
+            if jsonl:
+                timeout = max(next_heartbeat - time.perf_counter(), 0)
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                key = future_map[future]
+                try:
+                    result = future.result()
+                    _release_job(governor, future, result[4].get("peak_rss_bytes"))
+                    error = _merge_result(args, state, key, result)
+                except Exception as exc:
+                    _release_job(governor, future, None)
+                    error = _merge_result(
+                        args, state, key, _failed_result(key[1], exc), emit=True
+                    )
+                if error:
+                    errors += 1
+                    if args.fail_fast:
+                        stop = True
+                        break
+            if stop:
+                for future in pending:
+                    future.cancel()
+                break
+            if budget_bytes and _adjust_concurrency(governor) and jsonl:
+                _emit_event(
+                    "governor",
+                    limit=governor["limit"],
+                    reserved_bytes=governor["reserved"],
+                    budget_bytes=budget_bytes,
+                )
+            before = set(future_map)
+            _admit_jobs(executor, queue, governor, future_map)
+            pending |= set(future_map) - before
+            if jsonl and time.perf_counter() >= next_heartbeat:
+                in_flight = sum(1 for future in pending if future.running())
+                _emit_event("heartbeat", **_heartbeat_fields(progress, in_flight))
+                next_heartbeat = time.perf_counter() + args.heartbeat_interval
+    return errors
+
+
+def _job_payload(job, batch_index=0):
+    (
+        source_path,
+        output_dir,
+        temp_root,
+        keep_temp,
+        overwrite,
+        step_logs,
+        _,
+        profile,
+        describe_outputs,
+        _,
+    ) = job
+    if isinstance(source_path, ZipMemberSource):
+        source = source_path._asdict()
+    else:
+        source = str(Path(source_path).resolve())
+    return {
+        "key": str(source_path),
+        "batch": batch_index,
+        "source": source,
+        "output_dir": str(Path(output_dir).resolve()),
+        "temp_root": str(Path(temp_root).resolve()),
+        "keep_temp": keep_temp,
+        "overwrite": overwrite,
+        "step_logs": step_logs,
+        "profile_memory": bool(profile),
+        "describe_outputs": describe_outputs,
+    }
+
+
+def _job_from_payload(payload, events, lease=None):
+    source = payload["source"]
+    if isinstance(source, dict):
+        source = ZipMemberSource(**source)
+    else:
+        source = Path(source)
+    return (
+        source,
+        Path(payload["output_dir"]),
+        Path(payload["temp_root"]),
+        payload["keep_temp"],
+        payload["overwrite"],
+        payload["step_logs"],
+        events,
+        payload["profile_memory"],
+        payload.get("describe_outputs", False),
+        lease,
+    )
+
+
+def _coordinate(args, queue, state):
+    # Workers on other hosts see the same paths, so every path in a payload
+    # is absolute and the output/temp roots must live on shared storage.
+    jsonl = args.events == "jsonl"
+    progress = state["progress"]
+    conn = job_queue.open_queue(args.queue_db)
+    queue_name = job_queue.new_queue_name()
+    job_queue.enqueue(conn, queue_name, [_job_payload(job, key[0]) for job, _, _, key in queue])
+    if jsonl:
+        _emit_event("queue", queue_db=str(args.queue_db), queue=queue_name, jobs=len(queue))
+    elif not args.quiet:
+        print(f"QUEUE:{queue_name}:{len(queue)}")
+
+    errors = 0
+    last_seq = 0
+    next_heartbeat = time.perf_counter() + args.heartbeat_interval
+    try:
+        while progress["completed"] < len(queue):
+            job_queue.requeue_expired(conn, args.max_attempts)
+            for seq, payload, status, result in job_queue.finished_since(conn, queue_name, last_seq):
+                last_seq = seq
+                error = _merge_result(
+                    args,
+                    state,
+                    (payload.get("batch", 0), payload["key"]),
+                    (
+                        result.get("source", payload["key"]),
+                        result.get("output"),
+                        result.get("error") or (None if status == "done" else status),
+                        result.get("issues") or [],
+                        result.get("metrics") or {},
+                    ),
+                    emit=True,
+                )
+                if error:
+                    errors += 1
+                    if args.fail_fast:
+                        job_queue.cancel(conn, queue_name)
+                        return errors
+            if jsonl and time.perf_counter() >= next_heartbeat:
+                in_flight = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'leased'",
+                    (queue_name,),
+                ).fetchone()[0]
+                _emit_event("heartbeat", **_heartbeat_fields(progress, in_flight))
+                next_heartbeat = time.perf_counter() + args.heartbeat_interval
+            if progress["completed"] < len(queue):
+                time.sleep(job_queue.DEFAULT_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        job_queue.cancel(conn, queue_name)
+        raise
+    finally:
+        conn.close()
+    return errors
+
+
+def worker_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="xslt_pipeline.py worker",
+        description="Claim pipeline jobs from a shared queue and run them.",
+    )
+    parser.add_argument("--queue-db", required=True, help="Shared SQLite job queue.")
+    parser.add_argument(
+        "--queue",
+        default=None,
+        help="Only claim jobs from this queue (defaults to any queue).",
+    )
+    parser.add_argument(
+        "--xslt-dir",
+        default="XSLT",
+        help="Directory containing XSLT files.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to CPU count).",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=job_queue.DEFAULT_LEASE_SECONDS,
+        help="Lease length; leases are renewed at a third of this.",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=job_queue.DEFAULT_MAX_ATTEMPTS,
+        help="Expired leases after which a queued job is marked failed.",
+    )
+    parser.add_argument(
+        "--idle-exit",
+        type=float,
+        default=None,
+        help="Exit after this many seconds without work (default: run forever).",
+    )
+    parser.add_argument(
+        "--events",
+        choices=EVENT_MODES,
+        default="text",
+        help="Progress output format for this worker.",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Only print errors.",
+    )
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers or (os.cpu_count() or 4))
+    renew_every = max(args.lease_seconds / 3, 0.1)
+    owner = job_queue.worker_id()
+    queue_db = os.path.abspath(args.queue_db)
+    conn = job_queue.open_queue(queue_db)
+    in_flight = {}
+    idle_since = time.perf_counter()
+    next_renew = time.perf_counter() + renew_every
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(args.xslt_dir,),
+        ) as executor:
+            while True:
+                while len(in_flight) < workers:
+                    claimed = job_queue.claim(
+                        conn, owner, args.lease_seconds, args.queue, args.max_attempts
+                    )
+                    if claimed is None:
+                        break
+                    job_id, payload = claimed
+                    lease = (queue_db, job_id, owner, args.lease_seconds)
+                    future = executor.submit(
+                        _run_pipeline, _job_from_payload(payload, args.events, lease)
+                    )
+                    in_flight[future] = (job_id, payload["key"])
+
+                if not in_flight:
+                    if (
+                        args.idle_exit is not None
+                        and time.perf_counter() - idle_since >= args.idle_exit
+                    ):
+                        break
+                    time.sleep(job_queue.DEFAULT_POLL_INTERVAL)
+                    continue
+
+                done, _ = concurrent.futures.wait(
+                    in_flight,
+                    timeout=min(
+                        max(next_renew - time.perf_counter(), 0),
+                        job_queue.DEFAULT_POLL_INTERVAL,
+                    ),
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    job_id, key = in_flight.pop(future)
+                    failed = False
+                    try:
+                        source, output, error, issues, metrics = future.result()
+                    except Exception as exc:
+                        source, output, error, issues, metrics = (
+                            key, None, _format_error(exc), [], {}
+                        )
+                        failed = True
+                    result = {
+                        "source": source,
+                        "output": output,
+                        "error": error,
+                        "issues": issues,
+                        "metrics": metrics,
+                    }
+                    if not job_queue.complete(conn, job_id, owner, result, failed):
+                        print(f"ERROR:Lease lost for job {job_id}: {source}")
+                    elif args.events != "jsonl":
+                        if error:
+                            print(f"ERROR:{source}: {error}")
+                        elif not args.quiet:
+                            print(f"OK:{source} -> {output}")
+                if time.perf_counter() >= next_renew:
+                    for future, (job_id, key) in list(in_flight.items()):
+                        if job_queue.renew(conn, job_id, owner, args.lease_seconds):
+                            continue
+                        # Another worker has the job now. Its result is not
+                        # reported from here, and a job already running
+                        # stops before writing when its own renewal fails.
+                        future.cancel()
+                        del in_flight[future]
+                        print(f"ERROR:Lease lost for job {job_id}: {key}")
+                    next_renew = time.perf_counter() + renew_every
+                idle_since = time.perf_counter()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+    return 0
+
+
+def _parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Run the XSLT pipeline with Saxon/C (saxonche)."
     )
     parser.add_argument(
         "--input",
-        required=True,
-        help="Input XML file or directory containing XML files.",
+        action="append",
+        default=None,
+        help="Input XML file, directory containing XML files, or export "
+        "zip whose members are read without extracting the archive. Repeat "
+        "to process several export roots with one worker pool.",
     )
     parser.add_argument(
         "--output-dir",
-        required=True,
-        help="Output root directory.",
+        default=None,
+        help="Output root directory. With several --input roots, each one "
+        "is written to a subdirectory named after it.",
     )
     parser.add_argument(
         "--xslt-dir",
@@ -701,6 +1937,20 @@ def _parse_args():
         action="store_true",
         help="Allow deleting existing output directories.",
     )
+    parser.add_argument(
+        "--prune-stale",
+        action="store_true",
+        help="Before running, remove outputs no current source writes: dirs of "
+        "sources no longer in the input and .dita files outside any source's "
+        "output dir.",
+    )
+    parser.add_argument(
+        "--keep",
+        action="append",
+        default=None,
+        help="Top-level folder of the output root that --prune-stale leaves "
+        "alone (repeatable; the temp root is always kept).",
+    )
     parser.add_argument(
         "--keep-temp",
         action="store_true",
@@ -721,109 +1971,317 @@ def _parse_args():
         action="store_true",
         help="Print start/finish logs for each XSLT step.",
     )
-    return parser.parse_args()
+    workspace.add_job_arguments(parser, multiple=True)
+    parser.add_argument(
+        "--events",
+        choices=EVENT_MODES,
+        default="text",
+        help="Progress output format: text prefixes or one JSON object per line.",
+    )
+    parser.add_argument(
+        "--heartbeat-interval",
+        type=float,
+        default=DEFAULT_HEARTBEAT_INTERVAL,
+        help="Seconds between heartbeat events in jsonl mode.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Record per-stage memory use and write memory_profile.json.",
+    )
+    parser.add_argument(
+        "--profile-memory-sample",
+        type=float,
+        default=1.0,
+        help="Fraction of jobs to profile when --profile-memory is set (0-1).",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=int,
+        default=None,
+        help="Admit jobs only while their projected memory stays under this "
+        "budget (defaults to 75%% of system memory, 0 disables).",
+    )
+    parser.add_argument(
+        "--worker-memory-mb",
+        type=int,
+        default=DEFAULT_WORKER_MEMORY_MB,
+        help="Fixed memory cost assumed for each running job.",
+    )
+    parser.add_argument(
+        "--cost-history",
+        default=str(Path(tempfile.gettempdir(), COST_HISTORY_FILENAME)),
+        help="JSON file with memory costs learned from past runs "
+        "(empty string disables).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running: poll the input roots and reprocess only new or "
+        "changed sources, removing outputs of deleted ones (implies --overwrite).",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=DEFAULT_WATCH_INTERVAL,
+        help="Seconds between input scans in --watch mode.",
+    )
+    parser.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=DEFAULT_WATCH_DEBOUNCE,
+        help="Quiet period a burst of changes must settle for before it is processed.",
+    )
+    parser.add_argument(
+        "--queue-db",
+        default=None,
+        help="Distribute jobs through this shared SQLite queue instead of a "
+        "local pool; run 'xslt_pipeline.py worker --queue-db ...' on each host.",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=job_queue.DEFAULT_MAX_ATTEMPTS,
+        help="Expired leases after which a queued job is marked failed.",
+    )
+    parser.add_argument(
+        "--run-db",
+        default=os.getenv("XSLT_RUN_DB"),
+        help="SQLite database recording every run (empty string disables; "
+        f"defaults to <output-dir>/_tmp/{run_db.RUN_DB_FILENAME}, or the workspace "
+        "root with --job). Use 'xslt_pipeline.py compare' to diff two runs.",
+    )
+    return parser.parse_args(argv)
 
 
-def main():
+def saxonche_error():
     try:
         import saxonche  # noqa: F401
     except Exception:
-        print("ERROR: saxonche is required. Install with: pip install saxonche")
-        return 2
+        return "saxonche is required. Install with: pip install saxonche"
+    return None
 
-    args = _parse_args()
 
-    patterns = args.pattern or list(DEFAULT_PATTERNS)
-    inputs, input_root = _collect_inputs(args.input, patterns)
-    if not inputs:
-        print("ERROR: No input files matched.")
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        return run_db.compare_main(argv[1:])
+
+    error = saxonche_error()
+    if error:
+        print(f"ERROR: {error}")
         return 2
 
-    output_root = Path(args.output_dir)
-    output_root = output_root.resolve()
-    temp_root = Path(args.temp_root).resolve() if args.temp_root else output_root / "_tmp"
-    temp_root.mkdir(parents=True, exist_ok=True)
+    if argv and argv[0] == "worker":
+        return worker_main(argv[1:])
+
+    code, _ = run(argv)
+    return code
+
+
+def run(argv=None, on_output=None):
+    # Returns (exit code, report); the report is None when the run never
+    # started, and carries each output dir's described topics for callers
+    # that post-process in the same interpreter. on_output(output_dir,
+    # topics) is called as each source finishes, while others still run.
+    args = _parse_args(argv)
+    patterns = args.pattern or list(DEFAULT_PATTERNS)
+    try:
+        batches = _resolve_batches(args)
+    except (RuntimeError, ValueError) as exc:
+        print(f"ERROR: {exc}")
+        return 2, None
+
+    inputs = []
+    sources = {}
+    for batch_index, batch in enumerate(batches):
+        if args.watch and _is_zip_input(Path(batch["input"])):
+            print(f"ERROR: --watch needs a directory input, not a zip: {batch['input']}")
+            return 2, None
+        batch_inputs, batch_root = _collect_inputs(batch["input"], patterns)
+        if not batch_inputs and not args.watch:
+            print(f"ERROR: No input files matched: {batch['input']}")
+            return 2, None
+        batch["output_root"] = Path(batch["output_root"]).resolve()
+        if args.flat_output:
+            dita_manifest.discard(batch["output_root"])
+        batch["input_root"] = batch_root
+        batch["inputs"] = batch_inputs
+        batch["issues"] = []
+        batch["memory_profiles"] = []
+        batch["topics"] = {}
+        if args.temp_root:
+            batch["temp_root"] = Path(args.temp_root).resolve()
+        else:
+            batch["temp_root"] = batch["output_root"] / "_tmp"
+        batch["temp_root"].mkdir(parents=True, exist_ok=True)
+        for source_path in batch_inputs:
+            # Keyed by batch too: two --job batches may share a source file.
+            sources[(batch_index, str(source_path))] = (batch, source_path)
+        inputs.extend(batch_inputs)
+    multi_batch = len(batches) > 1
+    stale_removed = 0
+    if args.prune_stale and not args.flat_output and not args.watch:
+        for batch in batches:
+            keep = set(args.keep or [])
+            if batch["temp_root"].parent == batch["output_root"]:
+                keep.add(batch["temp_root"].name)
+            stale_removed += _prune_stale_outputs(
+                batch["output_root"],
+                [
+                    _output_dir_for_input(source, batch["input_root"], batch["output_root"], False)
+                    for source in batch["inputs"]
+                ],
+                keep,
+            )
 
     workers = args.workers or (os.cpu_count() or 4)
+    if args.watch:
+        return _watch(args, batches, patterns, max(1, workers)), None
     workers = max(1, min(workers, len(inputs)))
+    jsonl = args.events == "jsonl"
 
-    jobs = []
-    for source_path in inputs:
-        job_output = _output_dir_for_input(
-            source_path, input_root, output_root, args.flat_output
-        )
-        jobs.append(
-            (
-                source_path,
-                job_output,
-                temp_root,
-                args.keep_temp,
-                args.overwrite,
-                args.step_logs,
-            )
+    history = _load_cost_history(args.cost_history)
+    worker_bytes = max(args.worker_memory_mb, 0) * 1024 * 1024
+    if args.memory_budget_mb is None:
+        total_memory, _ = _system_memory()
+        budget_bytes = int(total_memory * DEFAULT_BUDGET_FRACTION) if total_memory else 0
+    else:
+        budget_bytes = max(args.memory_budget_mb, 0) * 1024 * 1024
+
+    queue = []
+    for key, (batch, source_path) in sources.items():
+        size = _file_size(source_path)
+        job = _job_for_source(source_path, batch, args)
+        queue.append((job, size, _estimate_job_memory(size, history, worker_bytes), key))
+    queue.sort(key=lambda entry: entry[2], reverse=True)
+    governor = _new_governor(workers, budget_bytes, history, worker_bytes)
+
+    progress = {
+        "started": time.perf_counter(),
+        "total_files": len(inputs),
+        "total_bytes": sum(_file_size(path) for path in inputs),
+        "completed": 0,
+        "failed": 0,
+        "bytes_done": 0,
+        "output_bytes": 0,
+        "files_written": 0,
+        "files_unchanged": 0,
+    }
+    if jsonl:
+        _emit_event(
+            "run_start",
+            input=[str(batch["input"]) for batch in batches],
+            output_dir=[str(batch["output_root"]) for batch in batches],
+            jobs=[batch["label"] for batch in batches if batch["label"]],
+            files=progress["total_files"],
+            input_bytes=progress["total_bytes"],
+            workers=workers,
+            memory_budget_bytes=budget_bytes,
         )
 
-    ctx = get_context("spawn")
-    errors = 0
-    all_rich_text_issues = []
+    db_conn = None
+    run_id = None
+    if args.run_db is None:
+        args.run_db = run_db.default_path(args.output_dir, args.workspace_root)
+    if args.run_db:
+        db_conn = run_db.open_run_db(args.run_db)
+        run_id = run_db.start_run(
+            db_conn,
+            ", ".join(str(batch["input"]) for batch in batches),
+            ", ".join(str(batch["output_root"]) for batch in batches),
+            workers,
+            vars(args),
+        )
 
-    with concurrent.futures.ProcessPoolExecutor(
-        max_workers=workers,
-        mp_context=ctx,
-        initializer=_init_worker,
-        initargs=(args.xslt_dir,),
-    ) as executor:
-        future_map = {executor.submit(_run_pipeline, job): job[0] for job in jobs}
-        for future in concurrent.futures.as_completed(future_map):
-            source_path = future_map[future]
-            try:
-                result_source, output_dir, error, rich_text_issues = future.result()
-                if rich_text_issues:
-                    all_rich_text_issues.extend(rich_text_issues)
-                if error:
-                    errors += 1
-                    print(f"ERROR:{result_source}: {error}")
-                    if args.fail_fast:
-                        for pending in future_map:
-                            pending.cancel()
-                        break
-                else:
-                    if not args.quiet:
-                        print(f"OK:{result_source} -> {output_dir}")
-            except Exception as exc:
-                errors += 1
-                print(f"ERROR:{source_path}: {exc}")
-                if args.fail_fast:
-                    for pending in future_map:
-                        pending.cancel()
-                    break
-
-    if all_rich_text_issues:
-        report_path = output_root / REPORT_FILENAME
-        with report_path.open("w", newline="", encoding="utf-8") as handle:
-            writer = csv.writer(handle)
-            writer.writerow(
-                ["source_file", "item_id", "item_name", "field_key", "issues", "snippet"]
+    state = {
+        "progress": progress,
+        "sources": sources,
+        "multi_batch": multi_batch,
+        "db_conn": db_conn,
+        "run_id": run_id,
+        "recorded": 0,
+        "on_output": on_output,
+    }
+    if args.queue_db:
+        errors = _coordinate(args, queue, state)
+    else:
+        errors = _run_local(args, queue, governor, state, workers, budget_bytes)
+
+    _save_cost_history(args.cost_history, history)
+    if db_conn is not None:
+        run_db.finish_run(db_conn, run_id, progress["completed"], errors)
+        db_conn.close()
+
+    report_paths = []
+    memory_report_paths = []
+    manifest_paths = []
+    for batch in batches:
+        if not args.flat_output:
+            manifest_path = dita_manifest.update(batch["output_root"], batch["topics"])
+            manifest_paths.append(str(manifest_path))
+            if not args.quiet and not jsonl:
+                print(f"MANIFEST:{manifest_path}")
+        if batch["issues"]:
+            report_path = _write_rich_text_report(batch["output_root"], batch["issues"])
+            report_paths.append(str(report_path))
+            if not args.quiet and not jsonl:
+                print(f"REPORT:{report_path}")
+        if args.profile_memory:
+            memory_report_path = _write_memory_report(
+                batch["output_root"],
+                batch["memory_profiles"],
+                len(batch["memory_profiles"]),
+                len(batch["inputs"]),
             )
-            for entry in all_rich_text_issues:
-                writer.writerow(
-                    [
-                        entry["source_file"],
-                        entry["item_id"],
-                        entry["item_name"],
-                        entry["field_key"],
-                        entry["issues"],
-                        entry["snippet"],
-                    ]
-                )
-        if not args.quiet:
-            print(f"REPORT:{report_path}")
+            memory_report_paths.append(str(memory_report_path))
+            if not args.quiet and not jsonl:
+                print(f"MEMORY_REPORT:{memory_report_path}")
+
+    report = {
+        "files": len(inputs),
+        "completed": progress["completed"],
+        "failed": progress["failed"],
+        "input_bytes": progress["bytes_done"],
+        "output_bytes": progress["output_bytes"],
+        "files_written": progress["files_written"],
+        "files_unchanged": progress["files_unchanged"],
+        "stale_removed": stale_removed,
+        "rich_text_issues": sum(len(batch["issues"]) for batch in batches),
+        "reports": report_paths,
+        "manifests": manifest_paths,
+        "run_id": run_id,
+        "topics": {
+            output_dir: topics
+            for batch in batches
+            for output_dir, topics in batch["topics"].items()
+        },
+    }
+    if jsonl:
+        summary = _heartbeat_fields(progress, 0)
+        summary.pop("eta_seconds")
+        _emit_event(
+            "summary",
+            status="failed" if errors else "done",
+            input_bytes=progress["bytes_done"],
+            output_bytes=progress["output_bytes"],
+            files_written=progress["files_written"],
+            files_unchanged=progress["files_unchanged"],
+            rich_text_issues=sum(len(batch["issues"]) for batch in batches),
+            report=report_paths[0] if report_paths else None,
+            reports=report_paths,
+            memory_report=memory_report_paths[0] if memory_report_paths else None,
+            manifests=manifest_paths,
+            run_id=run_id,
+            **summary,
+        )
+        return (1 if errors else 0), report
 
     if errors:
         print(f"FAILED:{errors}")
-        return 1
+        return 1, report
     print(f"DONE:{len(inputs)}")
-    return 0
+    return 0, report
 
 
 if __name__ == "__main__":
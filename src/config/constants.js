@@ -2,6 +2,8 @@ module.exports = {
   UPLOAD_DIR: 'uploads/',
   OUTPUT_DIR: 'output',
   XSLT_OUTPUT_DIR: 'xslt_output',
+  WORKSPACE_DIR: process.env.CONVERSION_WORKSPACE_ROOT || 'workspaces',
+  JOB_WORKSPACES: process.env.JOB_WORKSPACES !== 'false',
   MAX_FILE_SIZE: 100 * 1024 * 1024, // 100MB
   ALLOWED_MIME_TYPES: ['application/zip'],
   ALLOWED_EXTENSIONS: ['.zip']
@@ -1,43 +1,61 @@
+const convertService = require('../services/convertService');
 const imageHrefService = require('../services/imageHrefService');
 const ResponseUtil = require('../utils/responseUtil');
 const Logger = require('../utils/logger');
+const WorkspaceUtil = require('../utils/workspaceUtil');
+const { JOB_WORKSPACES } = require('../config/constants');
 
 class ImageHrefController {
   async replaceHrefs(req, res) {
     try {
       const dryRun = Boolean(req.body && req.body.dryRun);
-      Logger.info(`Starting image href replacement${dryRun ? ' (dry run)' : ''}.`);
-      const imageResult = await imageHrefService.replaceHrefs({ dryRun });
-      Logger.success('Image href replacement completed.');
-      Logger.info(`Starting .dita relocation${dryRun ? ' (dry run)' : ''}.`);
-      const ditaResult = await imageHrefService.relocateDitaFiles({ dryRun });
-      Logger.success('.dita relocation completed.');
-      Logger.info(`Starting blob copy${dryRun ? ' (dry run)' : ''}.`);
-      const blobCopyResult = await imageHrefService.copyBlobToXslt({ dryRun });
-      Logger.success('Blob copy completed.');
-      Logger.info(`Starting blob href replacement${dryRun ? ' (dry run)' : ''}.`);
-      const blobResult = await imageHrefService.replaceBlobImageHrefs({ dryRun });
-      Logger.success('Blob href replacement completed.');
-      Logger.info(`Starting xref href replacement${dryRun ? ' (dry run)' : ''}.`);
-      const xrefResult = await imageHrefService.replaceXrefHrefs({ dryRun });
-      Logger.success('Xref href replacement completed.');
+      const jobId = (req.body && req.body.jobId) || null;
+      // Uploads land in their own workspace, so without a job id there is
+      // no tree to rewrite; the shared output folders are not a fallback.
+      if (JOB_WORKSPACES && !jobId) {
+        return ResponseUtil.badRequest(res, 'jobId is required when job workspaces are enabled');
+      }
+      if (jobId && !WorkspaceUtil.isValidJobId(jobId)) {
+        return ResponseUtil.badRequest(res, `Invalid job id: ${jobId}`);
+      }
+      const options = { dryRun, jobId };
+      // Relocation, the blob copy and the fused href and <br/> rewrites run
+      // as stages of one Python process.
+      Logger.info(
+        `Starting .dita relocation, blob copy and href rewrites${dryRun ? ' (dry run)' : ''}.`
+      );
+      const conversion = await convertService.convert(null, {
+        jobId,
+        dryRun,
+        stages: ['relocate', 'copy_blobs', 'postprocess']
+      });
+      const ditaResult = imageHrefService.formatRelocation(conversion.relocate);
+      const blobCopyResult = {
+        sourceDir: conversion.copy_blobs.source_dir,
+        destDir: conversion.copy_blobs.dest_dir,
+        files: conversion.copy_blobs.files,
+        written: conversion.copy_blobs.written,
+        unchanged: conversion.copy_blobs.unchanged,
+        removed: conversion.copy_blobs.removed,
+        dryRun: conversion.copy_blobs.dry_run
+      };
+      const postprocessResult = conversion.postprocess;
+      Logger.success('.dita relocation, blob copy and href rewrites completed.');
       Logger.info(`Starting placeholder ditamap creation${dryRun ? ' (dry run)' : ''}.`);
-      const ditamapResult = await imageHrefService.createPlaceholderDitaMaps({ dryRun });
+      const ditamapResult = await imageHrefService.createPlaceholderDitaMaps(options);
       Logger.success('Placeholder ditamap creation completed.');
-      Logger.info(`Starting <br/> removal${dryRun ? ' (dry run)' : ''}.`);
-      const brResult = await imageHrefService.removeBrTags({ dryRun });
-      Logger.success('<br/> removal completed.');
       return ResponseUtil.success(
         res,
         dryRun ? 'Href replacement dry run completed' : 'Href replacements updated',
         {
-          images: imageResult,
+          jobId,
+          images: postprocessResult.passes.images,
           blobCopy: blobCopyResult,
-          blobImages: blobResult,
-          xrefs: xrefResult,
+          blobImages: postprocessResult.passes.blob,
+          xrefs: postprocessResult.passes.xref,
           ditaRelocation: ditaResult,
           ditamaps: ditamapResult,
-          brTags: brResult
+          brTags: postprocessResult.passes.br
         }
       );
     } catch (error) {
@@ -1,7 +1,8 @@
-const zipService = require('../services/zipService');
-const xsltService = require('../services/xsltService');
-const blobService = require('../services/blobService');
+const convertService = require('../services/convertService');
 const Validator = require('../utils/validator');
+const FileUtil = require('../utils/fileUtil');
+const WorkspaceUtil = require('../utils/workspaceUtil');
+const { JOB_WORKSPACES } = require('../config/constants');
 const ResponseUtil = require('../utils/responseUtil');
 const Logger = require('../utils/logger');
 
@@ -16,25 +17,49 @@ class UploadController {
         return ResponseUtil.badRequest(res, validation.error);
       }
 
-      const result = await zipService.extractZip(req.file.path);
-      const xsltResult = await xsltService.processOutput(result.outputDir);
-      const blobResult = await blobService.finalizeBlobExport();
+      const jobId = JOB_WORKSPACES ? WorkspaceUtil.createJobId() : null;
+      const paths = WorkspaceUtil.getPaths(jobId);
+      if (jobId) {
+        Logger.folder(`Job ${jobId} workspace: ${paths.root}`);
+      }
+
+      // Extraction, the XSLT pipeline and blob finalization run as stages
+      // of one Python process.
+      const conversion = await convertService.convert(req.file.path, {
+        jobId,
+        stages: ['extract', 'transform', 'blobs']
+      });
+      const blobResult = conversion.blobs;
+      Logger.complete(
+        `[BLOB] Placed ${blobResult.files} blob file(s) in output ` +
+          `(${blobResult.hardlinked} linked, ${blobResult.reflinked} reflinked, ` +
+          `${blobResult.copied} copied) and renamed ${blobResult.renamed} to .jpeg.`
+      );
       Logger.complete('Zip upload completed.');
 
       return ResponseUtil.success(res, 'Zip file processed successfully', {
-        extractedFiles: result.extractedCount,
-        outputDirectory: result.outputDir,
-        xsltProcessedFiles: xsltResult.processedFiles,
-        xsltOutputDirectory: xsltResult.outputDir,
-        blobRenamedFiles: blobResult.renamedFiles,
-        blobSourceDirectory: blobResult.sourceDir,
-        blobOutputDirectory: blobResult.destDir,
+        jobId,
+        extractedFiles: conversion.extract.files,
+        outputDirectory: conversion.output_dir,
+        xsltProcessedFiles: conversion.transform.completed,
+        xsltOutputDirectory: conversion.xslt_output_dir,
+        blobRenamedFiles: blobResult.renamed,
+        blobSourceDirectory: blobResult.source_dir,
+        blobOutputDirectory: blobResult.dest_dir,
         originalFileName: req.file.originalname
       });
 
     } catch (error) {
       Logger.error(`Upload error: ${error.message}`);
       return ResponseUtil.serverError(res, 'Failed to process zip file', error.message);
+    } finally {
+      if (req.file) {
+        try {
+          FileUtil.deleteFile(req.file.path);
+        } catch (cleanupError) {
+          Logger.error(`Upload cleanup error: ${cleanupError.message}`);
+        }
+      }
     }
   }
 }
@@ -7,7 +7,6 @@ const FileUtil = require('../utils/fileUtil');
 const storage = multer.diskStorage({
   destination: (req, file, cb) => {
     FileUtil.ensureDirectory(UPLOAD_DIR);
-    FileUtil.clearDirectory(UPLOAD_DIR);
     cb(null, UPLOAD_DIR);
   },
   filename: (req, file, cb) => {
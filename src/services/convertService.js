@@ -0,0 +1,121 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+const xsltService = require('./xsltService');
+const Logger = require('../utils/logger');
+const WorkspaceUtil = require('../utils/workspaceUtil');
+
+class ConvertService {
+  // Runs the selected stages (extract, transform, blobs, relocate,
+  // copy_blobs, postprocess) in one Python process, so the stages share
+  // the topic inventory and indexes instead of re-walking the tree.
+  convert(zipPath, options = {}) {
+    const { jobId = null, stages = [], dryRun = false } = options;
+    const paths = WorkspaceUtil.getPaths(jobId);
+    const scriptPath = path.join(process.cwd(), 'scripts', 'convert.py');
+    const pythonBin = process.env.PYTHON_BIN || 'python';
+    const workers = parseInt(process.env.XSLT_WORKERS, 10);
+
+    const args = [scriptPath];
+    if (zipPath) {
+      args.push(zipPath);
+    }
+    args.push('--base-dir', paths.root, '--events', 'jsonl');
+    if (stages.length > 0) {
+      args.push('--stages', stages.join(','));
+    }
+    if (Number.isFinite(workers) && workers > 0) {
+      args.push('--workers', String(workers));
+    }
+    if (dryRun) {
+      args.push('--dry-run');
+    }
+
+    return new Promise((resolve, reject) => {
+      const child = spawn(pythonBin, args, {
+        cwd: process.cwd(),
+        windowsHide: true
+      });
+
+      let result = null;
+      let errorLines = 0;
+      let stderrLines = 0;
+      const maxLogLines = 25;
+
+      const logErrorLine = (line) => {
+        errorLines += 1;
+        if (errorLines <= maxLogLines) {
+          Logger.error(`[CONVERT] ${line.replace('ERROR:', '')}`);
+        } else if (errorLines === maxLogLines + 1) {
+          Logger.error('[CONVERT] Additional errors suppressed.');
+        }
+      };
+
+      const stdoutReader = readline.createInterface({ input: child.stdout });
+      stdoutReader.on('line', (line) => {
+        if (!line) return;
+        if (line.startsWith('{')) {
+          let event = null;
+          try {
+            event = JSON.parse(line);
+          } catch (err) {
+            event = null;
+          }
+          if (event && event.event) {
+            xsltService.logEvent(event, logErrorLine);
+            return;
+          }
+        }
+        if (line.startsWith('RESULT:')) {
+          try {
+            result = JSON.parse(line.replace('RESULT:', ''));
+          } catch (err) {
+            Logger.error(`[CONVERT] Failed to parse result JSON: ${err.message}`);
+          }
+          return;
+        }
+        if (line.startsWith('ERROR:')) {
+          logErrorLine(line);
+          return;
+        }
+        Logger.info(`[CONVERT] ${line}`);
+      });
+
+      const stderrReader = readline.createInterface({ input: child.stderr });
+      stderrReader.on('line', (line) => {
+        if (!line) return;
+        stderrLines += 1;
+        if (stderrLines <= maxLogLines) {
+          Logger.error(`[CONVERT] ${line}`);
+        } else if (stderrLines === maxLogLines + 1) {
+          Logger.error('[CONVERT] Additional stderr output suppressed.');
+        }
+      });
+
+      child.on('error', (err) => {
+        reject(err);
+      });
+
+      child.on('close', (code) => {
+        stdoutReader.close();
+        stderrReader.close();
+
+        if (result && result.error) {
+          return reject(new Error(`Conversion failed at ${result.failed_stage}: ${result.error}`));
+        }
+
+        if (code !== 0) {
+          return reject(new Error(`Conversion failed with exit code ${code}`));
+        }
+
+        if (!result) {
+          return reject(new Error('Conversion did not return a result'));
+        }
+
+        resolve(result);
+      });
+    });
+  }
+}
+
+module.exports = new ConvertService();
@@ -0,0 +1,40 @@
+const crypto = require('crypto');
+const path = require('path');
+const { OUTPUT_DIR, XSLT_OUTPUT_DIR, WORKSPACE_DIR } = require('../config/constants');
+
+const JOB_ID_PATTERN = /^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$/;
+
+class WorkspaceUtil {
+  static createJobId() {
+    return `${Date.now()}-${crypto.randomBytes(4).toString('hex')}`;
+  }
+
+  static isValidJobId(jobId) {
+    return typeof jobId === 'string' && JOB_ID_PATTERN.test(jobId);
+  }
+
+  static getPaths(jobId = null) {
+    if (!jobId) {
+      return {
+        jobId: null,
+        root: process.cwd(),
+        outputDir: path.join(process.cwd(), OUTPUT_DIR),
+        xsltOutputDir: path.join(process.cwd(), XSLT_OUTPUT_DIR)
+      };
+    }
+
+    if (!this.isValidJobId(jobId)) {
+      throw new Error(`Invalid job id: ${jobId}`);
+    }
+
+    const root = path.resolve(process.cwd(), WORKSPACE_DIR, jobId);
+    return {
+      jobId,
+      root,
+      outputDir: path.join(root, OUTPUT_DIR),
+      xsltOutputDir: path.join(root, XSLT_OUTPUT_DIR)
+    };
+  }
+}
+
+module.exports = WorkspaceUtil;